@@ -21,6 +21,18 @@ global_auto_override = False
 global_annotations = False
 global_typelog = False
 
+# Module name patterns restricting the global modes above to some modules, e.g.
+# global_checking_include = ['myapp.*']. A pattern is a glob or a module name that
+# also covers its submodules. None includes all modules; exclusions take precedence.
+global_checking_include = None
+global_checking_exclude = []
+global_auto_override_include = None
+global_auto_override_exclude = []
+global_annotations_include = None
+global_annotations_exclude = []
+global_typelog_include = None
+global_typelog_exclude = []
+
 # Some behavior flags:
 
 check_override_at_runtime = False
@@ -49,6 +61,96 @@ strict_annotation_collision_check = False
 
 default_typecheck_depth = 10
 
+# Maximal number of objects deep_type visits in a single value; beyond it,
+# objects are typed shallowly. None means unlimited.
+default_typecheck_max_nodes = None
+
+# If True, deep_type types NumPy arrays by their items, e.g. as NDArray[float],
+# rather than as numpy.ndarray. Checks against NDArray[...] work either way.
+deep_type_ndarray = False
+
+# Sampling policy (k, m) for checking lists, sets, dicts and Iterables: only the
+# first k, the last k and m randomly chosen other items are checked. This can miss
+# violations, but never reports false ones. None means exhaustive checking.
+# Can also be set per function or class via @typechecked(sampling = (k, m)),
+# where sampling = False enforces exhaustive checking.
+container_sampling = None
+
+# Pass arguments declared as List[T] or Dict[K, V] to the callee as proxies that check
+# items when they are read or written, rather than checking all items at call time.
+# Such arguments are not list or dict instances, but pass further List/Dict checks.
+# Can also be set per function or class via @typechecked(lazy = True).
+lazy_container_checking = False
+
+# Maximal number of validated argument type tuples typechecked functions remember
+# to skip deep checks of arguments of the same shallow types; 0 disables this.
+fingerprint_cache_size = 64
+
+# Adaptive checking policy (n, k, m, p) for typechecked functions or None to check
+# every call. A function is checked fully for its first n calls. After k consecutive
+# passed checks only one in m calls is checked. After a violation or when arguments
+# of new types show up, the next p calls are checked again.
+# Can also be set per function or class via @typechecked(adaptive = (n, k, m, p)),
+# where adaptive = False disables the policy.
+adaptive_checking = None
+
+# Maximal number of argument type tuples per function the adaptive policy remembers
+# to tell arguments of new types; 0 disables noticing new types.
+adaptive_shape_cache_size = 64
+
+# Fraction of wall time typechecked functions and generators may spend on checks,
+# e.g. 0.02, or None for no limit. Once checks exceeded this budget, they are only
+# done with a probability that shrinks with the overspent time; skipped checks are
+# counted. See check_time_budget_stats and reset_check_time_budget.
+check_time_budget = None
+
+# If True, typechecked functions record their number of calls and the time spent
+# checking them. write_check_policy turns these records into a policy file.
+check_policy_recording = False
+
+# Policy file as written by write_check_policy, or None. Functions it marks as 'skip'
+# are not typechecked, functions marked as 'sample' are checked according to the
+# adaptive policy check_policy_sampling; see adaptive_checking.
+# The file is read when functions get typechecked, so set this before importing them.
+check_policy_file = None
+check_policy_sampling = (0, 0, 10, 1)
+
+# If True, typechecked functions only check calls from other modules or packages.
+# Calls from modules within the same package as the function are not checked.
+# Packages are given by the first boundary_package_depth components of module names;
+# None means that each module is a package of its own. Names in boundary_packages
+# declare packages explicitly, taking precedence over boundary_package_depth.
+# Must be set before functions get typechecked to apply to typecheck_codegen.
+check_boundaries_only = False
+boundary_package_depth = None
+boundary_packages = []
+
+# Per call site checking policy (n, m) or None. Each call site, i.e. calling code
+# object and bytecode offset, gets its first n calls of a typechecked function
+# checked and after that only one in m calls, or none if m is 0.
+# call_site_table_size bounds the number of call sites tracked; the least
+# recently used ones are dropped, so they start over with n checked calls.
+call_site_checking = None
+call_site_table_size = 10000
+
+# Maximal number of subtype verdicts kept by is_subtype's LRU-cache; 0 disables it.
+subtype_cache_size = 10000
+
+# Maximal number of predicates kept by compile_type's LRU-cache; 0 disables it.
+compiled_type_cache_size = 10000
+
+# Maximal number of classes for which typed base methods are cached; 0 disables this.
+typed_base_method_cache_size = 10000
+
+# Maximal number of evaluated typestrings cached; 0 disables this.
+typestring_cache_size = 10000
+
+# Let typechecked emit wrappers specialized to the signature of plain functions and
+# staticmethods, with checks for simple types like int, str or user classes inlined.
+# Can also be enabled per function via @typechecked(codegen = True).
+# Such wrappers evaluate do_logging_in_typechecked at decoration time.
+typecheck_codegen = False
+
 clean_traceback = True
 
 python3_5_executable = 'python3' # Must be >= 3.5.0
@@ -75,7 +177,7 @@ def set_global_auto_override(flag = True, retrospective = True):
 def set_global_annotations(flag = True, retrospective = True):
 	global global_annotations
 	global_annotations = flag
-	if global_checking and retrospective:
+	if global_annotations and retrospective:
 		_catch_up_global_annotations()
 	return global_annotations
 
@@ -156,15 +258,15 @@ from .type_util import deep_type, is_builtin_type, has_type_hints, \
 		get_generator_type, get_generator_yield_type, \
 		is_Union, get_Union_params, get_Tuple_params, \
 		get_Callable_args_res, _issubclass as is_subtype, _isinstance as is_of_type, \
-		make_Tuple, make_Union, annotations, get_member_types, Empty, \
-		_catch_up_global_annotations
+		make_Tuple, make_Union, annotations, get_member_types, Empty, NDArray, compile_type, \
+		check_time_budget_stats, reset_check_time_budget, _catch_up_global_annotations
 from .util import getargspecs, get_staticmethod_qualname, get_class_qualname, mro, \
 		get_class_that_defined_method, is_method, is_classmethod, _pytypes_excepthook
 from .stubfile_manager import get_stub_module, as_stub_func_if_any
 from .typechecker import typechecked, typechecked_module, no_type_check, \
 		is_no_type_check, override, check_argument_types, _catch_up_global_checking, \
 		_catch_up_global_auto_override, _catch_up_global_typelog, auto_override, \
-		typelogged
+		typelogged, write_check_policy, unchecked
 
 set_clean_traceback()
 
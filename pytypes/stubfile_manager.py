@@ -6,6 +6,7 @@ Created on 13.12.2016
 
 import sys, inspect, os, imp, subprocess
 import warnings, tempfile, atexit
+from weakref import WeakKeyDictionary
 from inspect import isclass, ismodule, ismethod
 from typing import Union, TupleMeta, GenericMeta, CallableMeta
 import pytypes; from pytypes import util
@@ -32,6 +33,11 @@ def _create_Python_2_stub(module_filepath, out_file = None):
 	subprocess.call([pytypes.python3_5_executable, conv_script,
 			'-s', '-o', out_file, module_filepath], env = {})
 
+# stub class -> runtime class; filled in by _match_classes
+_stub_class_map = {}
+# composite stub type -> matched type, or None if matching leaves it unchanged
+_match_stub_type_cache = WeakKeyDictionary()
+
 def _match_classes(stub_module_or_class, original_module_or_class, original_module_name):
 	classes = [cl[1] for cl in inspect.getmembers(original_module_or_class, isclass)]
 	for cl in classes:
@@ -42,10 +48,17 @@ def _match_classes(stub_module_or_class, original_module_or_class, original_modu
 			# However that might prevent some import tricks and modularity management in
 			# a smarter stubfile hierarchy. So we leave it like this for now.
 			stub_class._match_type = cl
+			_stub_class_map[stub_class] = cl
 			_match_classes(stub_class, cl, original_module_name)
 
 def _match_module(stub_module, original_module):
-	return _match_classes(stub_module, original_module, original_module.__name__)
+	res = _match_classes(stub_module, original_module, original_module.__name__)
+	_match_stub_type_cache.clear()
+	# Signatures resolved so far might refer to unmatched stub classes:
+	pytypes.type_util._clear_funcsigtypes_cache()
+	pytypes.typecomment_parser._clear_typestring_cache()
+	pytypes.type_util._clear_typed_base_method_cache()
+	return res
 
 def _re_match_module(module_name, final = False):
 	if sys.version_info.major >= 3:
@@ -205,10 +218,28 @@ def get_stub_module(func):
 	return None
 
 def _match_stub_type(stub_type):
-	if not (sys.version_info.major >= 3):
+	if not (sys.version_info.major >= 3) or len(_stub_class_map) == 0:
 		return stub_type
-	# Todo: Only apply if stub-module is involved
-	# Todo: Somehow cache results
+	if isclass(stub_type) and not isinstance(stub_type, GenericMeta):
+		try:
+			return _stub_class_map.get(stub_type, stub_type)
+		except TypeError:
+			return stub_type
+	try:
+		res = _match_stub_type_cache[stub_type]
+		return stub_type if res is None else res
+	except KeyError:
+		res = _match_stub_type_uncached(stub_type)
+	except TypeError:
+		# unhashable or not weakly referenceable
+		return _match_stub_type_uncached(stub_type)
+	try:
+		_match_stub_type_cache[stub_type] = None if res == stub_type else res
+	except TypeError:
+		pass
+	return res
+
+def _match_stub_type_uncached(stub_type):
 	if isinstance(stub_type, TupleMeta):
 		prms = pytypes.get_Tuple_params(stub_type)
 		res = pytypes.make_Tuple(tuple(_match_stub_type(t) for t in prms))
@@ -230,9 +261,10 @@ def _match_stub_type(stub_type):
 						[_match_stub_type(t) for t in stub_type.__args__[:-1]],
 						_match_stub_type(stub_type.__args__[-1]) ]) ]
 		else:
-			res = stub_type.__origin__[tuple(_match_stub_type(t) for t in stub_type.__args__)]
+			res = pytypes.type_util._make_Generic(stub_type.__origin__,
+					tuple(_match_stub_type(t) for t in stub_type.__args__))
 	elif isclass(stub_type):
-		res = stub_type._match_type if hasattr(stub_type, '_match_type') else stub_type
+		res = _stub_class_map.get(stub_type, stub_type)
 	else:
 		res = stub_type
 	return res
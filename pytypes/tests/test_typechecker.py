@@ -4,7 +4,7 @@ Created on 25.08.2016
 @author: Stefan Richthofer
 '''
 
-import unittest, sys, os, warnings
+import unittest, sys, os, shutil, warnings, tempfile, threading, types
 if __name__ == '__main__':
 	sys.path.append(sys.path[0]+os.sep+'..'+os.sep+'..')
 import pytypes
@@ -18,6 +18,11 @@ import typing; from typing import Tuple, List, Union, Any, Dict, Generator, Type
 		Generic, Iterable, Iterator, Sequence, Callable, Mapping, Set
 from numbers import Real
 import abc; from abc import abstractmethod
+import array
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 class testClass(str):
 	@typechecked
@@ -439,6 +444,16 @@ def testfunc_err(
 	# type: (...) -> Tuple[str, Real]
 	return a*a, a*b
 
+@typechecked(codegen = True)
+def testfunc_codegen(a, b, c = None, d = 'x'):
+	# type: (int, float, Union[testClass, None], str) -> int
+	return a+len(d)
+
+@typechecked(codegen = True)
+def testfunc_codegen_err(a, b):
+	# type: (int, List[int]) -> str
+	return a+len(b)
+
 @typechecked
 def testfunc2(a, b, c):
 	# type: (int, Real, testClass) -> Tuple[int, float]
@@ -1355,6 +1370,435 @@ class TestTypecheck(unittest.TestCase):
 		self.assertRaises(InputTypeError, lambda: testfunc_None_arg(4, 'vvv'))
 		self.assertRaises(ReturnTypeError, lambda: testfunc_None_ret_err(2, 3.0))
 
+	def test_function_sampling(self):
+		@typechecked(sampling = (2, 0))
+		def sampled_len(x):
+			# type: (List[List[int]]) -> int
+			return len(x)
+		@typechecked(sampling = False)
+		def exhaustive_len(x):
+			# type: (List[List[int]]) -> int
+			return len(x)
+		data = [[i] for i in range(1000)]
+		self.assertEqual(sampled_len(data), 1000)
+		data[500] = ['a']
+		self.assertEqual(sampled_len(data), 1000)
+		self.assertRaises(InputTypeError, lambda: exhaustive_len(data))
+		data[500] = [500]
+		data[-1] = ['a']
+		try:
+			sampled_len(data)
+			self.fail('expected InputTypeError')
+		except InputTypeError as e:
+			self.assertIn('sampling 4 of 1000 items', str(e))
+		data[-1] = [999]
+		data[500] = ['a']
+		self.assertFalse(pytypes.is_of_type(data, List[List[int]]))
+		sampling_tmp = pytypes.container_sampling
+		pytypes.container_sampling = (2, 0)
+		try:
+			self.assertTrue(pytypes.is_of_type(data, List[List[int]]))
+			self.assertRaises(InputTypeError, lambda: exhaustive_len(data))
+		finally:
+			pytypes.container_sampling = sampling_tmp
+
+	def test_function_lazy(self):
+		@typechecked(lazy = True)
+		def lazy_first(x):
+			# type: (List[int]) -> int
+			return x[0]
+		@typechecked(lazy = True)
+		def lazy_sum(x):
+			# type: (List[int]) -> int
+			return sum(x)
+		@typechecked(lazy = True)
+		def lazy_put(d, key, value):
+			# type: (Dict[str, int], Any, Any) -> int
+			d[key] = value
+			return len(d)
+		data = [1, 2, 'a']
+		self.assertEqual(lazy_first(data), 1)
+		self.assertRaises(InputTypeError, lambda: lazy_sum(data))
+		dct = {'a': 1}
+		self.assertEqual(lazy_put(dct, 'b', 2), 2)
+		self.assertEqual(dct, {'a': 1, 'b': 2})
+		self.assertRaises(TypeCheckError, lambda: lazy_put(dct, 'c', 'd'))
+		self.assertRaises(TypeCheckError, lambda: lazy_put(dct, 3, 4))
+		self.assertNotIn('c', dct)
+		# proxies support the list and dict API and don't escape to the caller
+		@typechecked(lazy = True)
+		def lazy_identity(x):
+			# type: (List[int]) -> List[int]
+			return x
+		@typechecked(lazy = True)
+		def lazy_ops(x):
+			# type: (List[int]) -> List[int]
+			y = x + [1]
+			y = [0] + y
+			z = x.copy()
+			z *= 2
+			x += [5]
+			return y + z + x * 2
+		@typechecked(lazy = True)
+		def lazy_dict_copy(d):
+			# type: (Dict[str, int]) -> Dict[str, int]
+			return d.copy()
+		data = [1, 2]
+		self.assertIs(type(lazy_identity([1])), list)
+		self.assertIs(lazy_identity(data), data)
+		self.assertEqual(lazy_ops(data), [0, 1, 2, 1, 1, 2, 1, 2, 1, 2, 5, 1, 2, 5])
+		self.assertEqual(data, [1, 2, 5])
+		self.assertRaises(InputTypeError, lambda: lazy_ops([1, 'a']))
+		copied = lazy_dict_copy(dct)
+		self.assertIs(type(copied), dict)
+		self.assertEqual(copied, dct)
+		self.assertIsNot(copied, dct)
+		# only frames of pytypes itself are skipped to find the call site,
+		# not those of any other directory that happens to be named pytypes
+		caller_file = os.path.join(tempfile.gettempdir(), 'pytypes', 'caller.py')
+		namespace = {'_call_site': pytypes.util._call_site}
+		exec(compile('def caller():\n\treturn _call_site()\n', caller_file, 'exec'), namespace)
+		self.assertEqual(namespace['caller'](), caller_file+':2')
+
+	def test_function_fingerprint(self):
+		@typechecked
+		def fingerprinted(a, b):
+			# type: (float, Union[int, str]) -> float
+			return a
+		self.assertEqual(fingerprinted(1.5, 'x'), 1.5)
+		self.assertEqual(fingerprinted(2.5, ''), 2.5)
+		self.assertEqual(fingerprinted(3, 'x'), 3)
+		self.assertEqual(fingerprinted(3, 'x'), 3)
+		self.assertRaises(InputTypeError, lambda: fingerprinted(3, 4.5))
+		num_tow_tmp = pytypes.apply_numeric_tower
+		pytypes.apply_numeric_tower = False
+		try:
+			self.assertRaises(InputTypeError, lambda: fingerprinted(3, 'x'))
+		finally:
+			pytypes.apply_numeric_tower = num_tow_tmp
+		self.assertEqual(fingerprinted(3, 'x'), 3)
+
+	def test_unchecked(self):
+		@typechecked
+		def checked_len(lst):
+			# type: (List[int]) -> int
+			return len(lst)
+		@pytypes.unchecked
+		def unchecked_len(lst):
+			return checked_len(lst)
+		other_thread = []
+		def call_in_thread():
+			try:
+				checked_len(['a'])
+			except InputTypeError:
+				other_thread.append('checked')
+		with pytypes.unchecked():
+			self.assertEqual(checked_len(['a']), 1)
+			self.assertEqual(testfunc_codegen(3.5, 'b', d = 'xy'), 5.5)
+			test_gen = testfunc_Generator()
+			self.assertIsNone(test_gen.send(None))
+			self.assertEqual(test_gen.send('fail'), 'bad yield')
+			with pytypes.unchecked():
+				self.assertEqual(checked_len(['a', 'b']), 2)
+			self.assertEqual(checked_len(['a']), 1)
+			thread = threading.Thread(target = call_in_thread)
+			thread.start()
+			thread.join()
+		self.assertEqual(other_thread, ['checked'])
+		self.assertRaises(InputTypeError, lambda: checked_len(['a']))
+		self.assertEqual(unchecked_len(['a']), 1)
+		self.assertRaises(InputTypeError, lambda: checked_len(['a']))
+		@pytypes.unchecked
+		def unchecked_gen(lst):
+			yield checked_len(lst)
+			yield checked_len(lst)
+		test_gen = unchecked_gen(['a'])
+		self.assertEqual(next(test_gen), 1)
+		self.assertRaises(InputTypeError, lambda: checked_len(['a']))
+		self.assertEqual(next(test_gen), 1)
+		test_gen = pytypes.unchecked(testfunc_Generator)()
+		self.assertIsNone(test_gen.send(None))
+		self.assertEqual(test_gen.send('fail'), 'bad yield')
+		self.assertEqual(unchecked_gen.__name__, 'unchecked_gen')
+		# calls are still logged, only the check is bypassed
+		logging_tmp = pytypes.do_logging_in_typechecked
+		pytypes.do_logging_in_typechecked = True
+		try:
+			with pytypes.unchecked():
+				self.assertEqual(checked_len(['a']), 1)
+		finally:
+			pytypes.do_logging_in_typechecked = logging_tmp
+		node = pytypes.typelogger._member_cache[checked_len.ch_func]
+		self.assertEqual(node.type_observations, [Tuple[List[str]]])
+
+	def test_check_boundaries_only(self):
+		boundaries_tmp = pytypes.check_boundaries_only
+		depth_tmp = pytypes.boundary_package_depth
+		packages_tmp = pytypes.boundary_packages
+		pytypes.check_boundaries_only = True
+		try:
+			@typechecked
+			def boundary_len(lst):
+				# type: (List[int]) -> int
+				return len(lst)
+			mod_name = boundary_len.__module__
+			def call_from(caller_module):
+				return eval('boundary_len(lst)',
+						{'__name__': caller_module, 'boundary_len': boundary_len, 'lst': ['a']})
+			self.assertEqual(boundary_len(['a']), 1)
+			self.assertRaises(InputTypeError, lambda: call_from('other'))
+			self.assertRaises(InputTypeError, lambda: call_from(mod_name+'.helpers'))
+			pytypes.boundary_packages = [mod_name]
+			self.assertEqual(call_from(mod_name+'.helpers'), 1)
+			pytypes.boundary_packages = []
+			pytypes.boundary_package_depth = 1
+			self.assertEqual(call_from(mod_name.split('.')[0]+'.helpers'), 1)
+			self.assertRaises(InputTypeError, lambda: call_from('other'))
+			logging_tmp = pytypes.do_logging_in_typechecked
+			pytypes.do_logging_in_typechecked = True
+			try:
+				self.assertEqual(boundary_len(['a']), 1)
+				self.assertRaises(InputTypeError, lambda: call_from('other'))
+			finally:
+				pytypes.do_logging_in_typechecked = logging_tmp
+		finally:
+			pytypes.check_boundaries_only = boundaries_tmp
+			pytypes.boundary_package_depth = depth_tmp
+			pytypes.boundary_packages = packages_tmp
+		self.assertRaises(InputTypeError, lambda: boundary_len(['a']))
+
+	def test_call_site_checking(self):
+		call_site_tmp = pytypes.call_site_checking
+		table_size_tmp = pytypes.call_site_table_size
+		pytypes.call_site_checking = (2, 3)
+		try:
+			@typechecked
+			def site_len(lst):
+				# type: (List[int]) -> int
+				return len(lst)
+			def call_at_a():
+				return site_len(['a'])
+			def call_at_b():
+				return site_len(['a'])
+			self.assertRaises(InputTypeError, call_at_a)
+			self.assertRaises(InputTypeError, call_at_a)
+			self.assertEqual(call_at_a(), 1)
+			self.assertEqual(call_at_a(), 1)
+			self.assertRaises(InputTypeError, call_at_a)
+			self.assertEqual(call_at_a(), 1)
+			# other call sites are counted separately, evicted ones start over
+			pytypes.call_site_table_size = 1
+			self.assertRaises(InputTypeError, call_at_b)
+			self.assertRaises(InputTypeError, call_at_a)
+			# typelogging does not affect this
+			logging_tmp = pytypes.do_logging_in_typechecked
+			pytypes.do_logging_in_typechecked = True
+			try:
+				self.assertRaises(InputTypeError, call_at_a)
+				self.assertEqual(call_at_a(), 1)
+			finally:
+				pytypes.do_logging_in_typechecked = logging_tmp
+			# m = 0 stops checking after n calls
+			pytypes.call_site_checking = (1, 0)
+			self.assertRaises(InputTypeError, call_at_b)
+			self.assertEqual(call_at_b(), 1)
+			self.assertEqual(call_at_b(), 1)
+			# a call site can be evicted by another thread between lookup and reordering
+			from collections import OrderedDict
+			class _EvictingTable(OrderedDict):
+				def __getitem__(self, key):
+					res = OrderedDict.__getitem__(self, key)
+					del self[key]
+					return res
+			sites_tmp = pytypes.typechecker._call_sites
+			pytypes.typechecker._call_sites = _EvictingTable()
+			try:
+				self.assertRaises(InputTypeError, call_at_b)
+				self.assertEqual(call_at_b(), 1)
+			finally:
+				pytypes.typechecker._call_sites = sites_tmp
+		finally:
+			pytypes.call_site_checking = call_site_tmp
+			pytypes.call_site_table_size = table_size_tmp
+
+	def test_function_adaptive(self):
+		@typechecked(adaptive = (2, 2, 3, 1))
+		def adaptive_len(lst):
+			# type: (List[int]) -> int
+			return len(lst)
+		self.assertEqual(adaptive_len([1]), 1)
+		self.assertEqual(adaptive_len([1, 2]), 2)
+		# after two passes only every third call is checked
+		self.assertEqual(adaptive_len(['a']), 1)
+		self.assertEqual(adaptive_len(['a']), 1)
+		self.assertRaises(InputTypeError, lambda: adaptive_len(['a']))
+		# a violation enforces checking again
+		self.assertRaises(InputTypeError, lambda: adaptive_len(['a']))
+		self.assertEqual(adaptive_len([3]), 1)
+		self.assertEqual(adaptive_len([3]), 1)
+		self.assertEqual(adaptive_len(['a']), 1)
+		# so do arguments of new types
+		self.assertRaises(InputTypeError, lambda: adaptive_len((1, 2)))
+		self.assertEqual(adaptive_len.adaptive_state[0], 10)
+
+		@typechecked(adaptive = (0, 0, 1000, 1))
+		def adaptive_first(lst):
+			# type: (List[int]) -> int
+			return lst[0]
+		self.assertRaises(InputTypeError, lambda: adaptive_first(['a']))
+		self.assertEqual(adaptive_first([1]), 1)
+		shape_cache_tmp = pytypes.adaptive_shape_cache_size
+		pytypes.adaptive_shape_cache_size = 0
+		try:
+			# new types are not noticed anymore
+			self.assertEqual(adaptive_first(('a',)), 'a')
+		finally:
+			pytypes.adaptive_shape_cache_size = shape_cache_tmp
+		self.assertRaises(InputTypeError, lambda: adaptive_first(('a',)))
+
+		@typechecked(adaptive = False)
+		def non_adaptive_len(lst):
+			# type: (List[int]) -> int
+			return len(lst)
+		adaptive_tmp = pytypes.adaptive_checking
+		pytypes.adaptive_checking = (0, 0, 1000, 0)
+		try:
+			self.assertRaises(InputTypeError, lambda: non_adaptive_len(['a']))
+		finally:
+			pytypes.adaptive_checking = adaptive_tmp
+
+	def test_check_policy(self):
+		def make_funcs():
+			@typechecked
+			def policy_hot(a):
+				# type: (int) -> int
+				return a
+			@typechecked
+			def policy_cold(a):
+				# type: (int) -> int
+				return a
+			return policy_hot, policy_cold
+		recording_tmp = pytypes.check_policy_recording
+		pytypes.check_policy_recording = True
+		try:
+			policy_hot, policy_cold = make_funcs()
+			for i in range(20):
+				policy_hot(i)
+			policy_cold(1)
+		finally:
+			pytypes.check_policy_recording = recording_tmp
+		fd, filename = tempfile.mkstemp()
+		os.close(fd)
+		policy_tmp = pytypes.check_policy_file
+		try:
+			pytypes.write_check_policy(filename, float('inf'), 0.0)
+			with open(filename) as policy_file:
+				entries = [line.split() for line in policy_file if 'policy_' in line]
+			self.assertEqual([(e[0], e[1].split('.')[-1], e[2]) for e in entries],
+					[('sample', 'policy_cold', '1'), ('sample', 'policy_hot', '20')])
+			# codegen wrappers record calls also if recording starts after decoration
+			codegen_tmp = pytypes.typecheck_codegen
+			pytypes.typecheck_codegen = True
+			try:
+				policy_hot, policy_cold = make_funcs()
+			finally:
+				pytypes.typecheck_codegen = codegen_tmp
+			self.assertIn('_pytypes_generic', policy_hot.__globals__)
+			hot_record = pytypes.typechecker._check_policy_records[entries[1][1]]
+			hot_calls = hot_record[0]
+			pytypes.check_policy_recording = True
+			try:
+				policy_hot(1)
+				policy_hot(2)
+			finally:
+				pytypes.check_policy_recording = recording_tmp
+			self.assertEqual(hot_record[0], hot_calls+2)
+			policy_hot(3)
+			self.assertEqual(hot_record[0], hot_calls+2)
+			# policy files can be edited by hand
+			with open(filename, 'a') as policy_file:
+				policy_file.write('skip %s\n' % entries[0][1])
+			pytypes.check_policy_file = filename
+			policy_hot, policy_cold = make_funcs()
+			self.assertEqual(policy_cold('x'), 'x')
+			self.assertEqual(policy_hot.adaptive_state[0], 0)
+			self.assertRaises(InputTypeError, lambda: policy_hot('x'))
+			self.assertEqual(policy_hot.adaptive_state[0], 1)
+			with open(filename+'.invalid', 'w') as policy_file:
+				policy_file.write('ignore %s\n' % entries[0][1])
+			pytypes.check_policy_file = filename+'.invalid'
+			self.assertRaises(ValueError, make_funcs)
+		finally:
+			pytypes.check_policy_file = policy_tmp
+			os.remove(filename)
+			if os.path.exists(filename+'.invalid'):
+				os.remove(filename+'.invalid')
+
+	def test_argskw_binder(self):
+		def defaults(a, b = 2, c = 'c'):
+			return a, b, c
+		def varargs(a, b = 2, *args, **kw):
+			return a, b, args, kw
+		def only_varargs(*args):
+			return args
+		def varkw(a, **kw):
+			return a, kw
+		cases = [(defaults, [((1,), {}), ((1, 3), {}), ((1,), {'c': 'd'}),
+						((), {'a': 1, 'b': 3}), ((1, 2, 'e'), {})]),
+				(varargs, [((1,), {}), ((1, 3, 4, 5), {}), ((1,), {'b': 3, 'x': 4}),
+						((), {'a': 1, 'x': 4})]),
+				(only_varargs, [((), {}), ((1, 2), {})]),
+				(varkw, [((1,), {}), ((), {'a': 1, 'x': 2}), ((1,), {'x': 2})])]
+		if sys.version_info.major >= 3:
+			namespace = {}
+			exec('def kwonly(a, b = 2, *, c, d = 4):\n\treturn a, b, c, d\n'
+					'def kwonly_varargs(a, *args, e = 5, f, **kw):\n\treturn a, args, e, f, kw\n'
+					'def kwonly_defaults(*, g = 7):\n\treturn g\n', namespace)
+			cases.extend([(namespace['kwonly'], [((1,), {'c': 3}), ((1, 2), {'c': 3, 'd': 5}),
+							((), {'a': 1, 'c': 3, 'd': 5})]),
+					(namespace['kwonly_varargs'], [((1,), {'f': 6}), ((1, 2, 3), {'f': 6, 'x': 7}),
+							((1,), {'e': 0, 'f': 6})]),
+					(namespace['kwonly_defaults'], [((), {}), ((), {'g': 8})])])
+		for func, calls in cases:
+			specs = pytypes.util.getargspecs(func)
+			binder = pytypes.util._make_argskw_binder(specs)
+			rebuild = pytypes.util._make_fromargskw_binder(specs)
+			for args, kw in calls:
+				argskw, err = pytypes.util._getargskw(args, kw, specs)
+				self.assertFalse(err)
+				self.assertEqual(binder(args, kw), argskw)
+				self.assertEqual(rebuild(argskw), pytypes.util.fromargskw(argskw, specs))
+				args2, kw2 = rebuild(argskw)
+				self.assertEqual(func(*args2, **kw2), func(*args, **kw))
+		# calls that don't match the signature fall back to _getargskw
+		for func, args, kw in [(defaults, (1, 2, 3, 4), {}), (varkw, (), {'x': 2})]:
+			specs = pytypes.util.getargspecs(func)
+			binder = pytypes.util._make_argskw_binder(specs)
+			argskw, err = pytypes.util._getargskw(args, kw, specs)
+			self.assertTrue(err)
+			self.assertEqual(binder(args, kw), argskw)
+
+	def test_function_codegen(self):
+		self.assertEqual(testfunc_codegen(3, 2.5), 4)
+		self.assertEqual(testfunc_codegen(3, 2, testClass('ab'), d = 'xyz'), 6)
+		self.assertRaises(InputTypeError, lambda: testfunc_codegen(3.5, 2.5))
+		self.assertRaises(InputTypeError, lambda: testfunc_codegen(3, 2.5, 'abc'))
+		self.assertRaises(InputTypeError, lambda: testfunc_codegen(3, 2.5, None, 'y', 7))
+		self.assertRaises(InputTypeError, lambda: testfunc_codegen_err(3, [1.5]))
+		self.assertRaises(ReturnTypeError, lambda: testfunc_codegen_err(3, [1, 2]))
+		# global policies set after decoration apply to codegen wrappers as well
+		call_site_tmp = pytypes.call_site_checking
+		pytypes.call_site_checking = (1, 0)
+		try:
+			call_at_a = lambda: testfunc_codegen(3.5, 2.5)
+			call_at_b = lambda: testfunc_codegen(3.5, 2.5)
+			self.assertRaises(InputTypeError, call_at_a)
+			self.assertEqual(call_at_a(), 4.5)
+			self.assertRaises(InputTypeError, call_at_b)
+		finally:
+			pytypes.call_site_checking = call_site_tmp
+		self.assertRaises(InputTypeError, call_at_a)
+
 	def test_classmethod(self):
 		tc = testClass('efgh')
 		self.assertEqual(tc.testmeth_class(23, 1.1),
@@ -1555,6 +1999,30 @@ class TestTypecheck(unittest.TestCase):
 				testfunc_Generator_arg(test_gen))
 		self.assertRaises(TypeCheckError, lambda: testfunc_Generator_ret())
 
+	def test_check_time_budget(self):
+		budget_tmp = pytypes.check_time_budget
+		pytypes.check_time_budget = 1e-9
+		pytypes.reset_check_time_budget()
+		try:
+			@typechecked
+			def budgeted(a):
+				# type: (int) -> int
+				return a
+			# the first check passes the budget, thereafter it is exhausted
+			test_gen = testfunc_Generator()
+			self.assertIsNone(test_gen.send(None))
+			self.assertEqual(test_gen.send('fail'), 'bad yield')
+			self.assertEqual(budgeted('abc'), 'abc')
+			spent, elapsed, skipped = pytypes.check_time_budget_stats()
+			self.assertGreater(spent, 0.0)
+			self.assertGreaterEqual(elapsed, spent)
+			self.assertGreaterEqual(skipped, 3)
+		finally:
+			pytypes.check_time_budget = budget_tmp
+			pytypes.reset_check_time_budget()
+		self.assertEqual(pytypes.check_time_budget_stats(), (0.0, 0.0, 0))
+		self.assertRaises(InputTypeError, lambda: budgeted('abc'))
+
 	def test_custom_generic(self):
 		self.assertEqual(testfunc_Generic_arg(Custom_Generic[str]('abc')), 'abc')
 		self.assertEqual(testfunc_Generic_ret(5).v(), 5)
@@ -1565,6 +2033,80 @@ class TestTypecheck(unittest.TestCase):
 		self.assertRaises(ReturnTypeError, lambda:
 				testfunc_Generic_ret_err(8))
 
+	def test_deep_type_traversal(self):
+		shared = [1, 2]
+		self.assertEqual(pytypes.deep_type([shared, shared]), List[List[int]])
+		self.assertEqual(pytypes.deep_type(([], [])), Tuple[pytypes.Empty[List], pytypes.Empty[List]])
+		cyclic = [3]
+		cyclic.append(cyclic)
+		self.assertEqual(pytypes.deep_type(cyclic), List[Union[int, list]])
+		self.assertEqual(pytypes.deep_type([[1], [2]], max_nodes = 3),
+				List[Union[List[int], list]])
+		self.assertEqual(pytypes.deep_type([[1], [2]], depth = 1), List[list])
+		self.assertEqual(pytypes.deep_type(list(range(10000))), List[int])
+		import gc, weakref
+		def make_class():
+			dyn_class = type('dyn_class', (object,), {})
+			pytypes.type_util._deep_type_kind(dyn_class)
+			self.assertIn(dyn_class, pytypes.type_util._deep_type_kinds)
+			return weakref.ref(dyn_class)
+		dyn_class_ref = make_class()
+		gc.collect()
+		self.assertIsNone(dyn_class_ref())
+		self.assertIs(pytypes.deep_type([1, (2, 'a')]), pytypes.deep_type([3, (4, 'b')]))
+		# interned types keep the order of nested Union arguments
+		union1 = pytypes.make_Union((int, str))
+		union2 = pytypes.make_Union((str, int))
+		list1 = pytypes.type_util._make_Generic(List, (union1,))
+		# typing's own cache is order-insensitive as well
+		for clear_cache in getattr(typing, '_cleanups', ()):
+			clear_cache()
+		list2 = pytypes.type_util._make_Generic(List, (union2,))
+		self.assertEqual(list1.__args__[0].__args__, (int, str))
+		self.assertEqual(list2.__args__[0].__args__, (str, int))
+		self.assertEqual(pytypes.deep_type(['a', '', 3, [4]]),
+				List[Union[str, pytypes.Empty[str], int, List[int]]])
+		self.assertEqual(pytypes.deep_type({'a': (1, 'b'), '': ('c', 2)}),
+				Dict[Union[str, pytypes.Empty[str]], Union[Tuple[int, str], Tuple[str, int]]])
+		nested = 1
+		for i in range(200):
+			nested = [nested]
+		tp = pytypes.deep_type(nested, depth = 250)
+		for i in range(200):
+			tp = tp.__args__[0]
+		self.assertEqual(tp, int)
+
+	def test_buffer_itemtype(self):
+		self.assertEqual(pytypes.get_iterable_itemtype(array.array('d', [1.5])), float)
+		self.assertEqual(pytypes.get_iterable_itemtype(bytearray(b'ab')), int)
+		self.assertTrue(pytypes.is_of_type(array.array('i', [1, 2]), Iterable[int]))
+		self.assertFalse(pytypes.is_of_type(array.array('i', [1, 2]), Iterable[str]))
+		if sys.version_info.major >= 3:
+			self.assertTrue(pytypes.is_of_type(memoryview(b'ab'), Iterable[int]))
+
+	@unittest.skipIf(numpy is None, 'requires NumPy')
+	def test_numpy_array(self):
+		arr = numpy.arange(100000, dtype=float)
+		self.assertIs(pytypes.deep_type(arr), numpy.ndarray)
+		self.assertEqual(pytypes.deep_type([arr]), List[numpy.ndarray])
+		ndarray_tmp = pytypes.deep_type_ndarray
+		pytypes.deep_type_ndarray = True
+		try:
+			self.assertEqual(pytypes.deep_type(arr), pytypes.NDArray[float])
+			self.assertEqual(pytypes.deep_type(numpy.array(['a'])), pytypes.NDArray[str])
+			self.assertEqual(pytypes.deep_type([arr]), List[pytypes.NDArray[float]])
+		finally:
+			pytypes.deep_type_ndarray = ndarray_tmp
+		self.assertTrue(pytypes.is_of_type(arr, Iterable[float]))
+		self.assertFalse(pytypes.is_of_type(arr, Iterable[str]))
+		self.assertTrue(pytypes.is_of_type(numpy.zeros((2, 2)),
+				Iterable[pytypes.NDArray[float]]))
+		self.assertTrue(pytypes.is_of_type(arr, pytypes.NDArray[float]))
+		self.assertFalse(pytypes.is_of_type(arr, pytypes.NDArray[int]))
+		self.assertTrue(pytypes.is_of_type(arr, numpy.ndarray))
+		self.assertTrue(pytypes.is_of_type([arr], List[numpy.ndarray]))
+		self.assertTrue(pytypes.is_of_type((arr, 1), Tuple[pytypes.NDArray[float], int]))
+
 	def test_various(self):
 		self.assertEqual(get_type_hints(testfunc),
 				{'a': int, 'c': str, 'b': Real, 'return': Tuple[int, Real]})
@@ -1659,6 +2201,268 @@ class TestTypecheck(unittest.TestCase):
 		self.assertTrue(pytypes.is_subtype(empty_set, Set[int]))
 		self.assertTrue(pytypes.is_subtype(empty_set, Set))
 
+	def test_funcsigtypes_cache(self):
+		import gc, weakref
+		def make_func():
+			def sigfunc(a):
+				# type: (int) -> str
+				return str(a)
+			return sigfunc
+		class sig_class(object):
+			def meth(self, a):
+				# type: (int) -> str
+				return str(a)
+		sigfunc = make_func()
+		sig = pytypes.type_util._funcsigtypes_matched(sigfunc, False)
+		self.assertEqual(sig, (Tuple[int], str))
+		self.assertIs(pytypes.type_util._funcsigtypes_matched(sigfunc, False), sig)
+		self.assertEqual(pytypes.type_util._funcsigtypes_matched(sig_class.meth, True, sig_class),
+				(Tuple[int], str))
+		self.assertIn(sigfunc, pytypes.type_util._funcsigtypes_cache)
+		# the cache does not keep functions or classes alive
+		refs = [weakref.ref(sigfunc), weakref.ref(sig_class)]
+		del sigfunc, sig_class
+		gc.collect()
+		self.assertEqual([ref() for ref in refs], [None, None])
+		# properties can't be referred to weakly, but get cached as well
+		sig = pytypes.type_util._funcsigtypes_matched(testClass_property.testprop, True,
+				testClass_property, True)
+		self.assertIs(pytypes.type_util._funcsigtypes_matched(testClass_property.testprop, True,
+				testClass_property, True), sig)
+
+	def test_typed_base_method_cache(self):
+		find = pytypes.type_util._find_typed_base_method
+		class base_cache(object):
+			def meth(self, a):
+				# type: (int) -> int
+				return a
+		class sub_cache(base_cache):
+			def meth(self, a):
+				return a
+		self.assertEqual(find(sub_cache.meth, sub_cache), (base_cache.meth, base_cache))
+		self.assertIs(find(sub_cache.meth, sub_cache)[1], base_cache)
+		def meth(self, a):
+			# type: (str) -> str
+			return a
+		sub_cache.meth = meth
+		# decorating the class drops entries that might be stale now
+		typechecked(sub_cache)
+		self.assertIs(find(sub_cache.meth, sub_cache)[1], sub_cache)
+		self.assertRaises(InputTypeError, lambda: sub_cache().meth(1))
+		self.assertEqual(sub_cache().meth('a'), 'a')
+		# so does matching a stub module
+		cache = pytypes.type_util._typed_base_method_cache
+		self.assertIs(find(base_cache.meth, base_cache)[1], base_cache)
+		self.assertIn('meth', cache[base_cache])
+		pytypes.stubfile_manager._match_module(types.ModuleType('stub_cache.pyi'),
+				types.ModuleType('stub_cache'))
+		self.assertNotIn(base_cache, cache)
+
+		# replacing a method without decorating the class is noticed as well
+		class sub_cache2(base_cache):
+			def meth(self, a):
+				return a
+		self.assertIs(find(sub_cache2.meth, sub_cache2)[1], base_cache)
+		sub_cache2.meth = meth
+		self.assertIs(find(sub_cache2.meth, sub_cache2)[1], sub_cache2)
+		del sub_cache2.meth
+		self.assertEqual(find(base_cache.meth, sub_cache2)[0], base_cache.meth)
+		# the cache does not keep classes alive, even if their methods refer to them
+		import gc, weakref
+		def make_class():
+			class sub_cache3(base_cache):
+				def meth(self, a):
+					return super(sub_cache3, self).meth(a)
+				@property
+				def prop(self):
+					return sub_cache3
+			self.assertIs(find(sub_cache3.meth, sub_cache3)[1], base_cache)
+			self.assertEqual(find(sub_cache3.prop, sub_cache3), (None, None))
+			self.assertIn(sub_cache3, cache)
+			return weakref.ref(sub_cache3)
+		refs = [weakref.ref(sub_cache2), make_class()]
+		del sub_cache2
+		gc.collect()
+		self.assertEqual([ref() for ref in refs], [None, None])
+
+	@unittest.skipUnless(sys.version_info.major >= 3, 'Only applicable in Python 3.')
+	def test_match_stub_type_cache(self):
+		sfm = pytypes.stubfile_manager
+		def make_modules(name):
+			original = types.ModuleType(name)
+			stub = types.ModuleType(name+'.pyi')
+			original.orig_class = type('orig_class', (object,), {'__module__': name})
+			stub.orig_class = type('orig_class', (object,), {'__module__': name+'.pyi'})
+			return stub, original
+		stub1, original1 = make_modules('stub_cache_testhelper1')
+		stub2, original2 = make_modules('stub_cache_testhelper2')
+		try:
+			# makes sure stub types are matched at all
+			sfm._match_module(stub1, original1)
+			self.assertIs(sfm._match_stub_type(stub1.orig_class), original1.orig_class)
+			tp = List[stub2.orig_class]
+			self.assertEqual(sfm._match_stub_type(tp), tp)
+			self.assertIn(tp, sfm._match_stub_type_cache)
+			# matching the stub module drops the entry, which was stale then
+			sfm._match_module(stub2, original2)
+			self.assertEqual(sfm._match_stub_type(tp), List[original2.orig_class])
+		finally:
+			sfm._stub_class_map.pop(stub1.orig_class, None)
+			sfm._stub_class_map.pop(stub2.orig_class, None)
+			sfm._match_stub_type_cache.clear()
+
+	def test_compile_type(self):
+		values = [3, 4.5, True, '', 'abc', None, [], [1, 2], [1, 'a'], [True],
+				['a', ''], {}, {'a': 1}, {'a': 1.5}, set([1]), (1, 'a'), (1, 2.5),
+				(1, 'a', 2), testClass('ab'), [testClass('cd'), 4]]
+		types = [int, float, str, Any, List[int], List[float], List[str], Sequence[str],
+				List[Union[int, str]], Dict[str, int], Dict[str, float], Set[int],
+				Tuple[int, str], Tuple[int, float], Tuple[float, Sequence[str]],
+				Union[int, None], Union[str, Tuple[int, str]], testClass,
+				List[Union[testClass, int]]]
+		for tp in types:
+			compiled = pytypes.compile_type(tp)
+			for val in values:
+				try:
+					expected = pytypes.is_of_type(val, tp)
+				except (AttributeError, TypeError):
+					# e.g. is_of_type({}, int) or is_of_type(3, Dict[str, int]) fail this way
+					continue
+				self.assertEqual(compiled(val), expected)
+		self.assertIs(pytypes.compile_type(List[int]), pytypes.compile_type(List[int]))
+		self.assertTrue(pytypes.compile_type(List[int])(list(range(10000))))
+		self.assertFalse(pytypes.compile_type(List[int])(list(range(10000))+['a']))
+		self.assertIn((List[int], False), pytypes.type_util._compiled_types)
+		size_tmp = pytypes.compiled_type_cache_size
+		pytypes.compiled_type_cache_size = 2
+		try:
+			pytypes.compile_type(Dict[int, complex])
+			pytypes.compile_type(Dict[str, complex])
+			pytypes.compile_type(Dict[int, complex])
+			pytypes.compile_type(Dict[float, complex])
+			# the least recently used predicate was dropped
+			self.assertEqual(list(pytypes.type_util._compiled_types),
+					[(Dict[int, complex], False), (Dict[float, complex], False)])
+		finally:
+			pytypes.compiled_type_cache_size = size_tmp
+		# cached predicates still follow flags and ABC registrations
+		num_tow_tmp = pytypes.apply_numeric_tower
+		try:
+			pytypes.apply_numeric_tower = True
+			self.assertTrue(pytypes.compile_type(Sequence[float])([1, 2]))
+			self.assertTrue(pytypes.compile_type(float)(1))
+			pytypes.apply_numeric_tower = False
+			self.assertFalse(pytypes.compile_type(Sequence[float])([1, 2]))
+			self.assertFalse(pytypes.compile_type(float)(1))
+		finally:
+			pytypes.apply_numeric_tower = num_tow_tmp
+		abc_base = abc.ABCMeta('abc_base', (object,), {})
+		class abc_sub(object):
+			pass
+		self.assertFalse(pytypes.compile_type(Sequence[abc_base])([abc_sub()]))
+		abc_base.register(abc_sub)
+		self.assertTrue(pytypes.compile_type(Sequence[abc_base])([abc_sub()]))
+
+	def test_subtype_cache(self):
+		num_tow_tmp = pytypes.apply_numeric_tower
+		pytypes.apply_numeric_tower = True
+		self.assertTrue(pytypes.is_subtype(int, float))
+		self.assertTrue(pytypes.is_subtype(Tuple[int, str], Tuple[float, str]))
+		pytypes.apply_numeric_tower = False
+		self.assertFalse(pytypes.is_subtype(int, float))
+		self.assertFalse(pytypes.is_subtype(Tuple[int, str], Tuple[float, str]))
+		pytypes.apply_numeric_tower = num_tow_tmp
+
+		abc_base = abc.ABCMeta('abc_base', (object,), {})
+		class abc_sub(object):
+			pass
+		self.assertFalse(pytypes.is_subtype(abc_sub, abc_base))
+		abc_base.register(abc_sub)
+		self.assertTrue(pytypes.is_subtype(abc_sub, abc_base))
+
+		# a verdict can be evicted by another thread between lookup and reordering
+		from collections import OrderedDict
+		class _EvictingCache(OrderedDict):
+			def __getitem__(self, key):
+				res = OrderedDict.__getitem__(self, key)
+				del self[key]
+				return res
+		cache_tmp = pytypes.type_util._subtype_cache
+		pytypes.type_util._subtype_cache = _EvictingCache()
+		try:
+			self.assertTrue(pytypes.is_subtype(int, object))
+			self.assertTrue(pytypes.is_subtype(int, object))
+		finally:
+			pytypes.type_util._subtype_cache = cache_tmp
+
+	def test_typecomment_index(self):
+		get_index = pytypes.typecomment_parser._get_typecomment_index
+		mod_dir = tempfile.mkdtemp()
+		filename = os.path.join(mod_dir, 'typecomment_index_testhelper.py')
+		try:
+			with open(filename, 'w') as mod_file:
+				mod_file.write('@staticmethod\ndef testfunc(a, # type: int\n\t\tb):\n'
+						'\t# type: (...) -> int\n\treturn a\n')
+			index = get_index(filename)
+			self.assertEqual(index[1], ('(...) -> int', ['int']))
+			self.assertIs(index[2], index[1])
+			self.assertIs(get_index(filename), index)
+			# the index is rebuilt once the file was modified
+			with open(filename, 'w') as mod_file:
+				mod_file.write('def testfunc(a, b):\n\t# type: (str, str) -> str\n\treturn a\n')
+			mtime = os.path.getmtime(filename)
+			os.utime(filename, (mtime+10, mtime+10))
+			self.assertEqual(get_index(filename), {1: ('(str, str) -> str', [])})
+		finally:
+			shutil.rmtree(mod_dir)
+
+	def test_typestring_cache(self):
+		evaluate = pytypes.typecomment_parser._eval_typestring
+		namespace = {'List': List, 'Item': int}
+		self.assertEqual(evaluate('List[Item]', namespace), List[int])
+		self.assertIs(evaluate('List[Item]', namespace), evaluate('List[Item]', namespace))
+		# rebinding a name invalidates the cached type, although the size stays the same
+		namespace['Item'] = str
+		self.assertEqual(evaluate('List[Item]', namespace), List[str])
+		del namespace['Item']
+		namespace['Other'] = float
+		self.assertRaises(NameError, lambda: evaluate('List[Item]', namespace))
+		# so does defining a name that was looked up in builtins before
+		self.assertEqual(evaluate('List[float]', namespace), List[float])
+		namespace['float'] = int
+		self.assertEqual(evaluate('List[float]', namespace), List[int])
+		# the cache is bounded
+		size_tmp = pytypes.typestring_cache_size
+		pytypes.typestring_cache_size = 1
+		try:
+			evaluate('List[Other]', namespace)
+			evaluate('Tuple[Other]', {'Tuple': Tuple, 'Other': int})
+			self.assertEqual(len(pytypes.typecomment_parser._typestring_cache), 1)
+		finally:
+			pytypes.typestring_cache_size = size_tmp
+
+		# stub namespaces follow rebound names of both modules
+		module = types.ModuleType('stub_globals_testhelper')
+		stub = types.ModuleType('stub_globals_testhelper.pyi')
+		module.Item = int
+		stub.List = List
+		stub.Item = float
+		sys.modules[module.__name__] = module
+		sys.modules[stub.__name__] = stub
+		try:
+			get_globals = pytypes.type_util._get_stub_globals
+			globs = get_globals(stub.__name__)
+			self.assertEqual(evaluate('List[Item]', globs), List[int])
+			module.Item = str
+			self.assertIs(get_globals(stub.__name__), globs)
+			self.assertEqual(evaluate('List[Item]', globs), List[str])
+			del module.Item
+			self.assertEqual(evaluate('List[Item]', get_globals(stub.__name__)), List[float])
+		finally:
+			del sys.modules[module.__name__]
+			del sys.modules[stub.__name__]
+			pytypes.type_util._stub_globals_cache.pop(stub.__name__, None)
+
 	def test_numeric_tower(self):
 		num_tow_tmp = pytypes.apply_numeric_tower
 		pytypes.apply_numeric_tower = True
@@ -2257,6 +3061,200 @@ class TestTypecheck_module(unittest.TestCase):
 		self.assertEqual(mth.testfunc(3, 2.5, 'abcd'), (9, 7.5))
 		self.assertRaises(InputTypeError, lambda: mth.testfunc(3, 2.5, 7))
 
+	@unittest.skipUnless(sys.version_info.major >= 3, 'Only applicable in Python 3.')
+	def test_global_checking_on_load(self):
+		import importlib
+		mod_dir = tempfile.mkdtemp()
+		with open(os.path.join(mod_dir, 'global_checking_testhelper.py'), 'w') as mod_file:
+			mod_file.write('def testfunc(a):\n\t# type: (int) -> int\n\treturn a\n')
+		global_tmp = pytypes.global_checking
+		pytypes.global_checking = True
+		sys.path.insert(0, mod_dir)
+		try:
+			mth = importlib.import_module('global_checking_testhelper')
+			pytypes.global_checking = global_tmp
+			self.assertEqual(mth.testfunc(3), 3)
+			self.assertRaises(InputTypeError, lambda: mth.testfunc('abc'))
+			# the loader is only wrapped during import
+			self.assertIs(mth.__spec__.loader, mth.__loader__)
+			self.assertFalse(isinstance(mth.__loader__, pytypes.typechecker._PytypesLoader))
+		finally:
+			pytypes.global_checking = global_tmp
+			sys.path.remove(mod_dir)
+			sys.modules.pop('global_checking_testhelper', None)
+			shutil.rmtree(mod_dir)
+
+	@unittest.skipUnless(sys.version_info.major >= 3, 'Only applicable in Python 3.')
+	def test_import_hook_processing(self):
+		import importlib
+		tc = pytypes.typechecker
+		finder = [f for f in sys.meta_path if isinstance(f, tc._PytypesFinder)][0]
+		mod_dir = tempfile.mkdtemp()
+		for mod_name in ('import_hook_testhelper', 'import_hook_idle_testhelper'):
+			with open(os.path.join(mod_dir, mod_name+'.py'), 'w') as mod_file:
+				mod_file.write('def testfunc(a):\n\t# type: (int) -> int\n\treturn a\n')
+		processed = []
+		process_tmp = tc._process_loaded_module
+		def _process_loaded_module(name, force_recursive = False):
+			processed.append(name)
+			process_tmp(name, force_recursive)
+		lookups = []
+		class counting_finder(object):
+			def find_spec(self, fullname, path, target = None):
+				lookups.append(fullname)
+		class counting_legacy_finder(object):
+			def find_module(self, fullname, path = None):
+				lookups.append(fullname)
+		counting_finders = [counting_finder(), counting_legacy_finder()]
+		global_tmp = pytypes.global_checking
+		delayed_tmp = tc._delayed_checks
+		stubs_tmp = dict(tc._stub_modules_loading)
+		tc._process_loaded_module = _process_loaded_module
+		sys.path.insert(0, mod_dir)
+		pos = sys.meta_path.index(finder)+1
+		sys.meta_path[pos:pos] = counting_finders
+		try:
+			# already imported modules are not processed again
+			pytypes.global_checking = True
+			mth = importlib.import_module('import_hook_testhelper')
+			self.assertEqual(processed, ['import_hook_testhelper'])
+			# each finder is asked once
+			self.assertEqual(lookups, ['import_hook_testhelper']*2)
+			self.assertIs(importlib.import_module('import_hook_testhelper'), mth)
+			import import_hook_testhelper
+			self.assertEqual(processed, ['import_hook_testhelper'])
+			self.assertRaises(InputTypeError, lambda: mth.testfunc('abc'))
+
+			# nothing pending, so the finder leaves lookups to the import system
+			pytypes.global_checking = False
+			tc._delayed_checks = []
+			tc._stub_modules_loading.clear()
+			self.assertFalse(tc._import_hook_active())
+			self.assertIsNone(finder.find_spec('import_hook_idle_testhelper', None))
+			mth2 = importlib.import_module('import_hook_idle_testhelper')
+			self.assertEqual(processed, ['import_hook_testhelper'])
+			self.assertEqual(mth2.testfunc('abc'), 'abc')
+		finally:
+			for counting in counting_finders:
+				sys.meta_path.remove(counting)
+			tc._process_loaded_module = process_tmp
+			pytypes.global_checking = global_tmp
+			tc._delayed_checks = delayed_tmp + tc._delayed_checks
+			tc._stub_modules_loading.update(stubs_tmp)
+			sys.path.remove(mod_dir)
+			sys.modules.pop('import_hook_testhelper', None)
+			sys.modules.pop('import_hook_idle_testhelper', None)
+			shutil.rmtree(mod_dir)
+
+
+	def test_global_mode_include_exclude(self):
+		applies = pytypes.util._global_mode_applies
+		include_tmp = pytypes.global_checking_include
+		exclude_tmp = pytypes.global_checking_exclude
+		try:
+			pytypes.global_checking_include = ['myapp.*']
+			self.assertTrue(applies('checking', 'myapp.core'))
+			self.assertFalse(applies('checking', 'myapp'))
+			self.assertTrue(applies('typelog', 'myapp'))
+			pytypes.global_checking_include.append('otherapp')
+			self.assertTrue(applies('checking', 'otherapp'))
+			self.assertTrue(applies('checking', 'otherapp.core'))
+			self.assertFalse(applies('checking', 'otherapplication'))
+			pytypes.global_checking_exclude = ['myapp.tests*']
+			self.assertFalse(applies('checking', 'myapp.tests.test_core'))
+			self.assertTrue(applies('checking', 'myapp.core'))
+		finally:
+			pytypes.global_checking_include = include_tmp
+			pytypes.global_checking_exclude = exclude_tmp
+		self.assertTrue(applies('checking', 'myapp'))
+
+		mod_dir = tempfile.mkdtemp()
+		for mod_name in ('global_include_testhelper', 'global_exclude_testhelper'):
+			with open(os.path.join(mod_dir, mod_name+'.py'), 'w') as mod_file:
+				mod_file.write('def testfunc(a):\n\t# type: (int) -> int\n\treturn a\n')
+		sys.path.insert(0, mod_dir)
+		global_tmp = pytypes.global_checking
+		override_tmp = pytypes.global_auto_override
+		pytypes.global_checking_include = ['global_include_*']
+		pytypes.global_auto_override_include = ['global_include_*']
+		try:
+			import global_include_testhelper, global_exclude_testhelper
+			pytypes.set_global_checking(True)
+			pytypes.set_global_auto_override(True)
+			self.assertRaises(InputTypeError, lambda: global_include_testhelper.testfunc('a'))
+			self.assertEqual(global_exclude_testhelper.testfunc('a'), 'a')
+		finally:
+			pytypes.global_checking = global_tmp
+			pytypes.global_auto_override = override_tmp
+			pytypes.global_checking_include = include_tmp
+			pytypes.global_auto_override_include = None
+			sys.path.remove(mod_dir)
+			sys.modules.pop('global_include_testhelper', None)
+			sys.modules.pop('global_exclude_testhelper', None)
+			shutil.rmtree(mod_dir)
+
+	def test_typechecked_module_incremental(self):
+		mod_dir = tempfile.mkdtemp()
+		with open(os.path.join(mod_dir, 'incremental_testhelper.py'), 'w') as mod_file:
+			mod_file.write('def testfunc(a):\n\t# type: (int) -> int\n\treturn a\n')
+		sys.path.insert(0, mod_dir)
+		try:
+			import incremental_testhelper as mth
+			pytypes.typechecked_module(mth)
+			wrapped = mth.testfunc
+			self.assertRaises(InputTypeError, lambda: wrapped('a'))
+			pytypes.typechecked_module(mth)
+			self.assertIs(mth.testfunc, wrapped)
+			# a replaced member is processed, although the module size is the same
+			def testfunc(a):
+				# type: (str) -> str
+				return a
+			testfunc.__module__ = mth.__name__
+			mth.testfunc = testfunc
+			pytypes.typechecked_module(mth)
+			self.assertIsNot(mth.testfunc, testfunc)
+			self.assertEqual(mth.testfunc('a'), 'a')
+			self.assertRaises(InputTypeError, lambda: mth.testfunc(1))
+			# only functions and classes are recorded, deleted names are dropped
+			mth.testdata = [1, 2, 3]
+			pytypes.typechecked_module(mth)
+			processed = pytypes.typechecker._fully_typechecked_modules[mth.__name__]
+			self.assertIn('testfunc', processed)
+			self.assertNotIn('testdata', processed)
+			del mth.testfunc
+			pytypes.typechecked_module(mth)
+			self.assertNotIn('testfunc', processed)
+			# methods added to a processed class are processed as well
+			class testclass(object):
+				def testmeth(self, a):
+					# type: (int) -> int
+					return a
+			testclass.__module__ = mth.__name__
+			mth.testclass = testclass
+			pytypes.typechecked_module(mth)
+			self.assertRaises(InputTypeError, lambda: testclass().testmeth('a'))
+			def testmeth2(self, a):
+				# type: (int) -> int
+				return a
+			testclass.testmeth2 = testmeth2
+			pytypes.typechecked_module(mth)
+			self.assertRaises(InputTypeError, lambda: testclass().testmeth2('a'))
+			# skipped members are considered again with force_recursive
+			@pytypes.no_type_check
+			def testfunc_ntc(a):
+				# type: (int) -> int
+				return a
+			testfunc_ntc.__module__ = mth.__name__
+			mth.testfunc_ntc = testfunc_ntc
+			pytypes.typechecked_module(mth)
+			self.assertEqual(mth.testfunc_ntc('a'), 'a')
+			self.assertNotIn('testfunc_ntc', processed)
+			pytypes.typechecked_module(mth, True)
+			self.assertRaises(InputTypeError, lambda: mth.testfunc_ntc('a'))
+		finally:
+			sys.path.remove(mod_dir)
+			sys.modules.pop('incremental_testhelper', None)
+			shutil.rmtree(mod_dir)
 
 class Test_check_argument_types(unittest.TestCase):
 	def test_function(self):
@@ -3528,6 +4526,16 @@ class TestTypecheck_Python3_5(unittest.TestCase):
 		self.assertRaises(InputTypeError, lambda: py3.testfunc_None_arg(4, 'vvv'))
 		self.assertRaises(ReturnTypeError, lambda: py3.testfunc_None_ret_err(2, 3.0))
 
+	def test_unchecked_coroutine(self):
+		import asyncio
+		loop = asyncio.new_event_loop()
+		try:
+			self.assertEqual(loop.run_until_complete(py3.unchecked_coroutine(['a'])), 1)
+		finally:
+			loop.close()
+		self.assertRaises(InputTypeError, lambda: py3.checked_len_py3(['a']))
+
+
 	def test_classmethod_py3(self):
 		tc = py3.testClass('efgh')
 		self.assertEqual(tc.testmeth_class(23, 1.1),
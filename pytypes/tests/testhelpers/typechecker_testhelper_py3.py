@@ -4,6 +4,7 @@ Created on 12.09.2016
 @author: Stefan Richthofer
 '''
 
+import asyncio
 import pytypes
 from pytypes import typechecked, override, check_argument_types, auto_override
 from typing import Tuple, Union, Mapping, Dict, Generator, TypeVar, Generic, \
@@ -1272,3 +1273,13 @@ class B_auto_override_err(A_auto_override):
 
 	def meth_2(self, c: str) -> int:
 		return 3*len(c)
+
+
+@typechecked
+def checked_len_py3(lst: List[int]) -> int:
+	return len(lst)
+
+@pytypes.unchecked
+async def unchecked_coroutine(lst: List[int]) -> int:
+	await asyncio.sleep(0)
+	return checked_len_py3(lst)
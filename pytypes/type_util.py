@@ -10,9 +10,36 @@ import typing; from typing import Tuple, Dict, List, Set, Union, Any, TupleMeta,
 from .stubfile_manager import _match_stub_type, as_stub_func_if_any
 from .typecomment_parser import _get_typestrings, _funcsigtypesfromstring
 from . import util
-import  sys, types, pytypes
+import  sys, types, array, random, threading, time, pytypes
+from collections import OrderedDict
+try:
+	from collections.abc import MutableSequence, MutableMapping
+except ImportError:
+	# Python 2
+	from collections import MutableSequence, MutableMapping
+from weakref import WeakValueDictionary, WeakKeyDictionary, ref as _weakref
+try:
+	from abc import get_cache_token as _get_abc_cache_token
+except ImportError:
+	# Python 2
+	import abc
+	_get_abc_cache_token = lambda: abc.ABCMeta._abc_invalidation_counter
 
 _annotated_modules = {}
+# function -> {(slf, func_class, ...): (actual function, annotations, signature)}
+_funcsigtypes_cache = WeakKeyDictionary()
+# same for functions without support for weak references, e.g. properties
+_funcsigtypes_cache_strong = {}
+_stub_globals_cache = {}
+# class -> {method name: (refs to the members of that name along the MRO, ref to found class)}
+_typed_base_method_cache = WeakKeyDictionary()
+_compiled_types = OrderedDict()
+_fingerprint_sigs = {}
+_subtype_cache = OrderedDict()
+_interned_types = WeakValueDictionary()
+_subtype_cache_gen = None
+# keyed weakly, so dynamically created classes can be freed
+_deep_type_kinds = WeakKeyDictionary()
 _extra_dict = {}
 for tp in typing.__all__:
 	tpa = getattr(typing, tp)
@@ -25,13 +52,101 @@ if not tuple in _extra_dict:
 
 if sys.version_info.major >= 3:
 	_basestring = str
+	_atomic_types = set([int, float, complex, bool, type(None)])
+	_atomic_container_types = set([str, bytes, bytearray, frozenset, range])
 else:
 	_basestring = basestring
+	_atomic_types = set([int, long, float, complex, bool, type(None)])
+	_atomic_container_types = set([str, unicode, bytearray, frozenset, xrange])
 
 EMPTY = TypeVar('EMPTY', bound=Container, covariant=True)
 class Empty(Generic[EMPTY]):
 	pass
 
+ARRAY_ITEM = TypeVar('ARRAY_ITEM', covariant=True)
+class NDArray(Generic[ARRAY_ITEM]):
+	'''Type of NumPy arrays parameterized by the Python type their dtype maps to,
+	e.g. numpy.zeros(3) is of type NDArray[float]. Arrays of a dtype without
+	such a Python type are NDArray[Any]. See pytypes.deep_type_ndarray.
+	'''
+	pass
+
+# Python types of the items of NumPy arrays by dtype.kind
+_dtype_kind_types = {'b': bool, 'i': int, 'u': int, 'f': float, 'c': complex,
+		'U': str if sys.version_info.major >= 3 else unicode, 'S': bytes}
+
+# Python types of the items of array.array and memoryview by typecode resp. format
+_buffer_format_types = {'?': bool, 'f': float, 'd': float, 'e': float,
+		'c': bytes, 'u': str if sys.version_info.major >= 3 else unicode}
+for fmt in 'bBhHiIlLqQnNP':
+	_buffer_format_types[fmt] = int
+
+def _numpy_ndarray():
+	# NumPy is only considered if it was already imported by someone else
+	np = sys.modules.get('numpy')
+	return None if np is None else np.ndarray
+
+def _ndarray_type(arr):
+	return _make_Generic(NDArray, _dtype_kind_types.get(arr.dtype.kind, Any))
+
+def _is_NDArray(tp):
+	return isinstance(tp, GenericMeta) and (tp is NDArray or tp.__origin__ is NDArray)
+
+def _type_args(tp):
+	if is_Union(tp):
+		return get_Union_params(tp)
+	if isinstance(tp, TupleMeta):
+		return get_Tuple_params(tp)
+	return getattr(tp, '__args__', None)
+
+def _has_NDArray(tp):
+	if _is_NDArray(tp):
+		return True
+	args = _type_args(tp)
+	return not args is None and any(_has_NDArray(t) for t in args)
+
+def _has_Callable(tp):
+	if isinstance(tp, CallableMeta):
+		return True
+	args = _type_args(tp)
+	return not args is None and any(_has_Callable(t) for t in args)
+
+def _strip_NDArray(tp):
+	'''Replaces NDArray[...] by numpy.ndarray within the deep type tp.'''
+	if _is_NDArray(tp):
+		return _numpy_ndarray()
+	if not _has_NDArray(tp):
+		return tp
+	args = tuple(_strip_NDArray(t) for t in _type_args(tp))
+	if is_Union(tp):
+		return make_Union(args)
+	if isinstance(tp, TupleMeta):
+		return make_Tuple(args)
+	return tp.__origin__[args]
+
+def _buffer_itemtype(obj):
+	'''Returns the item type of NumPy arrays, array.array, memoryview and bytes-like
+	objects as derived from their dtype, typecode or format, i.e. without iterating
+	over obj. Returns None if obj is none of these or its item type is unknown.
+	'''
+	tp = type(obj)
+	if tp is bytearray or (tp is bytes and sys.version_info.major >= 3):
+		return int
+	if tp is array.array:
+		return _buffer_format_types.get(obj.typecode)
+	if tp is memoryview and sys.version_info.major >= 3:
+		if obj.ndim != 1:
+			return None
+		return _buffer_format_types.get(obj.format.lstrip('@=<>!'))
+	ndarray = _numpy_ndarray()
+	if not ndarray is None and tp is ndarray:
+		if obj.ndim == 0:
+			return None
+		if obj.ndim > 1:
+			return _ndarray_type(obj)
+		return _dtype_kind_types.get(obj.dtype.kind)
+	return None
+
 def get_generator_yield_type(genr):
 	return get_generator_type(genr).__args__[0]
 
@@ -41,6 +156,31 @@ def get_generator_type(genr):
 	else:
 		return _funcsigtypes(genr.gi_code, False, None, genr.gi_frame.f_globals)[1]
 
+def _make_Generic(origin, args):
+	'''Returns origin[args]. Structurally identical types built this way are interned,
+	i.e. they are created once and then reused as long as they are alive.
+	'''
+	# Union equality ignores the order of arguments, so args are also identified by
+	# identity. This way Union arguments keep their order, e.g. in error messages.
+	if isinstance(args, tuple):
+		key = (origin, args, tuple(id(arg) for arg in args))
+	else:
+		key = (origin, args, id(args))
+	try:
+		return _interned_types[key]
+	except KeyError:
+		pass
+	except TypeError:
+		# args not hashable, e.g. for Callable
+		return origin[args]
+	res = origin[args]
+	try:
+		_interned_types[key] = res
+	except TypeError:
+		# res not weakly referenceable
+		pass
+	return res
+
 def make_Union(arg_tpl):
 # Should work now by monkeypatching in pytypes.
 # However we leave this sample here for a while...
@@ -58,10 +198,10 @@ def make_Union(arg_tpl):
 # 						arg_tpl = tuple([ntp if t is None else t for t in arg_tpl])
 # 					res.__args__ = arg_tpl
 # 					return res
-	return Union[arg_tpl]
+	return _make_Generic(Union, arg_tpl)
 
 def make_Tuple(arg_tpl):
-	res = Tuple[arg_tpl]
+	res = _make_Generic(Tuple, arg_tpl)
 # Should work now by monkeypatching in pytypes.
 # However we leave this sample here for a while...
 # Once we remove it, we will also inline make_Tuple again.
@@ -76,6 +216,9 @@ def make_Tuple(arg_tpl):
 
 def get_iterable_itemtype(obj):
 	# support further specific iterables on demand
+	itp = _buffer_itemtype(obj)
+	if not itp is None:
+		return itp
 	try:
 		if isinstance(obj, range):
 			tpl = tuple(deep_type(obj.start), deep_type(obj.stop), deep_type(obj.step))
@@ -84,12 +227,14 @@ def get_iterable_itemtype(obj):
 		# We're running Python 2
 		pass
 	if type(obj) is tuple:
-		tpl = tuple(deep_type(t) for t in obj)
+		sampling = _get_sampling()
+		tpl = tuple(_deep_type_for_checks(t) for t in
+				(_sample_items(obj, sampling) if sampling else obj))
 		return make_Union(tpl)
 	elif type(obj) is types.GeneratorType:
 		return get_generator_yield_type(obj)
 	else:
-		tp = deep_type(obj)
+		tp = _deep_type_for_checks(obj)
 		if isinstance(tp, GenericMeta):
 			if issubclass(tp.__origin__, typing.Iterable):
 				if len(tp.__args__) == 1:
@@ -166,49 +311,337 @@ def is_Union(tp):
 		except AttributeError:
 			return False
 
-def deep_type(obj, depth = pytypes.default_typecheck_depth):
-	return _deep_type(obj, [], depth)
+def deep_type(obj, depth = None, max_nodes = None, sampling = None):
+	'''Tries to construct a type for a given value. In contrast to type(obj),
+	this works for nested containers, e.g. deep_type([1, 2]) is List[int].
+	depth limits the nesting level that is explored, max_nodes the total number
+	of visited objects. Beyond these limits, objects are typed shallowly, i.e. like
+	by type(obj). Defaults are pytypes.default_typecheck_depth and
+	pytypes.default_typecheck_max_nodes.
+	sampling is a policy (k, m) to type lists, sets and dicts only by some of their
+	items, see pytypes.container_sampling. False enforces to use all items.
+	Default is the policy of the current check, if any, else pytypes.container_sampling.
+	NumPy arrays are typed as numpy.ndarray, see pytypes.deep_type_ndarray.
+	'''
+	res = _deep_type_for_checks(obj, depth, max_nodes, sampling)
+	if not pytypes.deep_type_ndarray and not _numpy_ndarray() is None and _has_NDArray(res):
+		res = _strip_NDArray(res)
+	return res
 
-def _deep_type(obj, checked, depth):
+def _deep_type_for_checks(obj, depth = None, max_nodes = None, sampling = None):
+	'''Like deep_type, but always types NumPy arrays as NDArray[...].
+	'''
+	if depth is None:
+		depth = pytypes.default_typecheck_depth
+	if max_nodes is None:
+		max_nodes = pytypes.default_typecheck_max_nodes
+	if sampling is None:
+		sampling = _get_sampling()
+	return _deep_type(obj, depth, max_nodes, sampling)
+
+# Sampling policy and statistics of the check currently running in a thread
+_sampling_state = threading.local()
+
+def _get_sampling():
 	try:
-		res = obj.__orig_class__
+		policy = _sampling_state.policy
 	except AttributeError:
-		res = type(obj)
-	if depth == 0 or obj in checked:
-		return res
-	else:
-		checked.append(obj)
-	if res == tuple:
-		tpl = tuple(_deep_type(t, checked, depth-1) for t in obj)
-		res = make_Tuple(tpl)
-	elif res == list:
-		if len(obj) == 0:
-			return Empty[List]
-		tpl = tuple(_deep_type(t, checked, depth-1) for t in obj)
-		res = List[make_Union(tpl)]
-	elif res == dict:
-		if len(obj) == 0:
-			return Empty[Dict]
-		tpl1 = tuple(_deep_type(t, checked, depth-1) for t in obj.keys())
-		tpl2 = tuple(_deep_type(t, checked, depth-1) for t in obj.values())
-		res = Dict[make_Union(tpl1), make_Union(tpl2)]
-	elif res == set:
-		if len(obj) == 0:
-			return Empty[Set]
-		tpl = tuple(_deep_type(t, checked, depth-1) for t in obj)
-		res = Set[make_Union(tpl)]
-	elif res == types.GeneratorType:
-		res = get_generator_type(obj)
-	elif sys.version_info.major == 2 and isinstance(obj, types.InstanceType):
-		# For old-style instances return the actual class:
-		return obj.__class__
-	elif _issubclass_2(res, Container) and len(obj) == 0:
-		return Empty[res]
-	elif hasattr(res, '__origin__') and \
-			_issubclass_2(res.__origin__, Container) and len(obj) == 0:
-		return Empty[res.__origin__]
+		policy = None
+	return pytypes.container_sampling if policy is None else policy
+
+def _set_sampling(policy):
+	'''Sets the sampling policy for the current thread and resets the sampling
+	statistics. None falls back to pytypes.container_sampling.
+	Returns the previous policy.
+	'''
+	prev = getattr(_sampling_state, 'policy', None)
+	_sampling_state.policy = policy
+	_sampling_state.stats = [0, 0]
+	return prev
+
+def _restore_sampling(policy):
+	# like _set_sampling, but keeps the statistics for _sampling_note
+	_sampling_state.policy = policy
+
+def _sampling_note():
+	'''Describes how far sampling was applied since the last _set_sampling, for use
+	in error messages. Returns an empty string if no items were left out.
+	'''
+	try:
+		sampled, total = _sampling_state.stats
+	except AttributeError:
+		return ''
+	if sampled == total:
+		return ''
+	return '\nNote: Large containers were checked by sampling %d of %d items (%.2g%%). ' \
+			'Sampling can miss violations, but this one is certain.' \
+			% (sampled, total, 100.0*sampled/total)
+
+def _sample_items(items, sampling):
+	'''Returns the items to check according to the sampling policy (k, m), i.e.
+	the first k, the last k and m randomly chosen other items. Returns items
+	unchanged if it has no more than 2*k+m elements.
+	'''
+	k, m = sampling
+	n = len(items)
+	if n <= 2*k+m:
+		return items
+	seq = items if type(items) is list else list(items)
+	res = seq[:k]
+	if k > 0:
+		res.extend(seq[-k:])
+	res.extend(seq[i] for i in random.sample(range(k, n-k), m))
+	try:
+		stats = _sampling_state.stats
+		stats[0] += len(res)
+		stats[1] += n
+	except AttributeError:
+		pass
 	return res
 
+try:
+	_perf_counter = time.perf_counter
+except AttributeError:
+	# Python 2
+	_perf_counter = time.time
+
+# Start of accounting, time spent checking and number of skipped checks
+# regarding pytypes.check_time_budget
+_check_budget_state = [None, 0.0, 0]
+
+def _check_budget_allows(budget):
+	'''Tells whether a check fits into the given fraction of wall time. Once the
+	budget is exhausted, checks are still done with a probability that shrinks with
+	the overspent time. Otherwise they are counted as skipped.
+	'''
+	now = _perf_counter()
+	if _check_budget_state[0] is None:
+		_check_budget_state[0] = now
+	allowed = budget*(now-_check_budget_state[0])
+	spent = _check_budget_state[1]
+	if spent <= allowed or random.random()*spent < allowed:
+		return True
+	_check_budget_state[2] += 1
+	return False
+
+def _charge_check_time(start):
+	_check_budget_state[1] += _perf_counter()-start
+
+def check_time_budget_stats():
+	'''Returns (spent, elapsed, skipped), i.e. the seconds spent checking and
+	passed since accounting for pytypes.check_time_budget started, and the number
+	of checks skipped due to the budget.
+	'''
+	start, spent, skipped = _check_budget_state
+	return spent, 0.0 if start is None else _perf_counter()-start, skipped
+
+def reset_check_time_budget():
+	'''Restarts accounting for pytypes.check_time_budget.'''
+	_check_budget_state[:] = [None, 0.0, 0]
+
+try:
+	import contextvars
+	_unchecked_var = contextvars.ContextVar('pytypes_unchecked', default = False)
+	_is_unchecked = _unchecked_var.get
+except ImportError:
+	# Python < 3.7, so pytypes.unchecked applies per thread rather than per task
+	_unchecked_var = None
+	_unchecked_state = threading.local()
+	_is_unchecked = lambda: getattr(_unchecked_state, 'active', False)
+
+def _set_unchecked(active):
+	'''Sets whether checks are bypassed in the current context.
+	Returns a token for _reset_unchecked.
+	'''
+	if _unchecked_var is None:
+		prev = _is_unchecked()
+		_unchecked_state.active = active
+		return prev
+	return _unchecked_var.set(active)
+
+def _reset_unchecked(token):
+	if _unchecked_var is None:
+		_unchecked_state.active = token
+	else:
+		_unchecked_var.reset(token)
+
+def _budgeted_isinstance(obj, cls):
+	'''Like _isinstance, but regards pytypes.check_time_budget and pytypes.unchecked.
+	A check skipped due to these counts as passed.
+	'''
+	if _is_unchecked():
+		return True
+	budget = pytypes.check_time_budget
+	if not budget:
+		return _isinstance(obj, cls)
+	if not _check_budget_allows(budget):
+		return True
+	start = _perf_counter()
+	try:
+		return _isinstance(obj, cls)
+	finally:
+		_charge_check_time(start)
+
+if sys.version_info >= (3, 6):
+	# dicts preserve insertion order
+	_distinct_types = lambda items: dict.fromkeys(map(type, items))
+else:
+	_distinct_types = lambda items: OrderedDict.fromkeys(map(type, items))
+
+def _scan_items(items, leaf, item_types, pending, slots):
+	'''Appends the deep types of items to item_types, as far as they can be derived from
+	the distinct item types. For the remaining items, a placeholder is appended;
+	these items are appended to pending and their placeholder indices to slots.
+	leaf indicates that items are typed shallowly, i.e. at depth 0.
+	'''
+	tps = _distinct_types(items)
+	rec = None
+	for tp in tps:
+		kind = _deep_type_kind(tp)
+		if kind == 0 or leaf and kind < 4:
+			item_types.append(tp)
+		elif kind == 1:
+			# for these types, truth value means non-empty
+			sel = items if len(tps) == 1 else [item for item in items if type(item) is tp]
+			if any(sel):
+				item_types.append(tp)
+			if not all(sel):
+				item_types.append(_make_Generic(Empty, tp))
+		else:
+			if rec is None:
+				rec = set()
+			rec.add(tp)
+	if not rec is None:
+		for item in items:
+			if type(item) in rec:
+				slots.append(len(item_types))
+				item_types.append(None)
+				pending.append(item)
+
+def _deep_type(obj, depth, max_nodes = None, sampling = None):
+	# Traverses obj iteratively via an explicit stack of frames
+	# [obj, res, depth, pending items, next pending index, item types,
+	#  placeholder indices of pending items in item types, number of key types].
+	# Items are grouped by their concrete type, only items that aren't typed by
+	# their type alone are traversed. Containers currently on the stack are
+	# tracked by identity to detect cycles, finished containers are memoized
+	# by identity and depth.
+	stack = []
+	visiting = set()
+	done = {}
+	nodes = 0
+	while True:
+		nodes += 1
+		try:
+			res = obj.__orig_class__
+		except AttributeError:
+			res = type(obj)
+		pending = None
+		if depth == 0 or (not max_nodes is None and nodes > max_nodes) \
+				or id(obj) in visiting:
+			pass
+		elif res == tuple or res == list or res == dict or res == set:
+			key = (id(obj), depth)
+			if key in done:
+				res = done[key]
+			elif len(obj) == 0:
+				if res == tuple:
+					res = make_Tuple(())
+				elif res == list:
+					res = _make_Generic(Empty, List)
+				elif res == dict:
+					res = _make_Generic(Empty, Dict)
+				else:
+					res = _make_Generic(Empty, Set)
+			else:
+				pending = []
+				slots = []
+				item_types = []
+				split = 0
+				items = obj
+				if sampling and not res == tuple:
+					# dicts are sampled by keys
+					items = _sample_items(obj, sampling)
+				if res == dict:
+					keys = obj.keys() if items is obj else items
+					values = obj.values() if items is obj else [obj[key] for key in items]
+				size = 2*len(items) if res == dict else len(items)
+				if not max_nodes is None and nodes+size > max_nodes:
+					# traverse all items to spend the budget in order
+					pending.extend(keys if res == dict else items)
+					if res == dict:
+						split = len(pending)
+						pending.extend(values)
+					slots.extend(range(len(pending)))
+					item_types.extend([None]*len(pending))
+				elif res == tuple:
+					for item in obj:
+						kind = _deep_type_kind(type(item))
+						if kind == 0 or depth == 1 and kind < 4:
+							item_types.append(type(item))
+						else:
+							slots.append(len(item_types))
+							item_types.append(None)
+							pending.append(item)
+				elif res == dict:
+					_scan_items(keys, depth == 1, item_types, pending, slots)
+					split = len(item_types)
+					_scan_items(values, depth == 1, item_types, pending, slots)
+				else:
+					_scan_items(items, depth == 1, item_types, pending, slots)
+				nodes += size-len(pending)
+				frame = [obj, res, depth, pending, 0, item_types, slots, split]
+				if len(pending) == 0:
+					pending = None
+					res = frame
+		elif res == types.GeneratorType:
+			res = get_generator_type(obj)
+		elif res is _numpy_ndarray():
+			res = _ndarray_type(obj)
+		elif sys.version_info.major == 2 and isinstance(obj, types.InstanceType):
+			# For old-style instances return the actual class:
+			res = obj.__class__
+		elif _issubclass_2(res, Container) and len(obj) == 0:
+			res = _make_Generic(Empty, res)
+		elif hasattr(res, '__origin__') and \
+				_issubclass_2(res.__origin__, Container) and len(obj) == 0:
+			res = _make_Generic(Empty, res.__origin__)
+		if not pending is None:
+			stack.append(frame)
+			visiting.add(id(obj))
+			obj = pending[0]
+			frame[4] = 1
+			depth -= 1
+			continue
+		# res is final for obj (or a frame without pending items),
+		# hand it to the enclosing containers
+		while True:
+			if type(res) is list:
+				frame = res
+				tpls = frame[5]
+				if frame[1] == tuple:
+					res = make_Tuple(tuple(tpls))
+				elif frame[1] == list:
+					res = _make_Generic(List, make_Union(tuple(tpls)))
+				elif frame[1] == dict:
+					res = _make_Generic(Dict, (make_Union(tuple(tpls[:frame[7]])),
+							make_Union(tuple(tpls[frame[7]:]))))
+				else:
+					res = _make_Generic(Set, make_Union(tuple(tpls)))
+				done[(id(frame[0]), frame[2])] = res
+			if not stack:
+				return res
+			frame = stack[-1]
+			frame[5][frame[6][frame[4]-1]] = res
+			if frame[4] < len(frame[3]):
+				obj = frame[3][frame[4]]
+				frame[4] += 1
+				depth = frame[2]-1
+				break
+			stack.pop()
+			visiting.discard(id(frame[0]))
+			res = frame
+
 def is_builtin_type(tp):
 	return hasattr(__builtins__, tp.__name__) and tp is getattr(__builtins__, tp.__name__)
 
@@ -397,6 +830,26 @@ def _handle_defaults(sig_types, arg_specs, unspecified_indices = None):
 		return res
 	return sig_types
 
+def _get_stub_globals(stub_module_name):
+	'''Returns the namespace typestrings of the given stub module are evaluated in,
+	i.e. the stub module's globals updated by those of the module it belongs to.
+	The same dict is returned for the stub module each time, so typestrings evaluated
+	in it can be cached, but its content is brought up to date on every call.
+	'''
+	stub_dict = sys.modules[stub_module_name].__dict__
+	mod_dict = sys.modules[stub_module_name.rsplit('.', 1)[0]].__dict__
+	merged = dict(stub_dict)
+	merged.update(mod_dict)
+	try:
+		globs = _stub_globals_cache[stub_module_name]
+	except KeyError:
+		_stub_globals_cache[stub_module_name] = merged
+		return merged
+	for key in [key for key in globs if not key in merged]:
+		del globs[key]
+	globs.update(merged)
+	return globs
+
 def _funcsigtypes(func0, slf, func_class = None, globs = None, prop_getter = False,
 		unspecified_type = Any, infer_defaults = None):
 	if infer_defaults is None:
@@ -427,9 +880,7 @@ def _funcsigtypes(func0, slf, func_class = None, globs = None, prop_getter = Fal
 			tpStr[1].append(None)
 	if globs is None:
 		if func.__module__.endswith('.pyi') or func.__module__.endswith('.pyi2'):
-			globs = {}
-			globs.update(sys.modules[func.__module__].__dict__)
-			globs.update(sys.modules[func.__module__.rsplit('.', 1)[0]].__dict__)
+			globs = _get_stub_globals(func.__module__)
 		else:
 			globs = sys.modules[func.__module__].__dict__
 	argNames = util.getargnames(argSpecs)
@@ -507,6 +958,59 @@ def _funcsigtypes(func0, slf, func_class = None, globs = None, prop_getter = Fal
 				func0.__annotations__ = _get_type_hints(func0, res2[0], res2[1])
 	return res
 
+def _funcsigtypes_matched(func0, slf, func_class = None, prop_getter = False):
+	'''Like _funcsigtypes, but with stub types already matched to their runtime
+	counterparts. Results are cached, so the signature of a checked function is
+	only resolved once per (function, class) rather than on every call.
+	The cache refers to functions and classes only weakly where possible.
+	'''
+	try:
+		cls_ref = None if func_class is None else _weakref(func_class)
+	except TypeError:
+		cls_ref = func_class
+	key = (slf, cls_ref, prop_getter,
+			pytypes.infer_default_value_types, pytypes.annotations_override_typestring,
+			pytypes.strict_annotation_collision_check)
+	try:
+		entries = _funcsigtypes_cache.get(func0)
+		if entries is None:
+			entries = {}
+			_funcsigtypes_cache[func0] = entries
+	except TypeError:
+		# no weak references to func0
+		key = (func0,)+key
+		entries = _funcsigtypes_cache_strong
+	try:
+		actual_func_ref, annots, res = entries[key]
+		# Reassigning __annotations__ (e.g. on a typechecked-wrapper) invalidates the entry
+		actual_func = actual_func_ref()
+		if not actual_func is None and \
+				getattr(actual_func, '__annotations__', None) is annots:
+			return res
+	except KeyError:
+		pass
+	except TypeError:
+		# unhashable func0 or func_class
+		key = None
+	argSig, resSig = _funcsigtypes(func0, slf, func_class, None, prop_getter)
+	res = _match_stub_type(argSig), _match_stub_type(resSig)
+	if not key is None:
+		actual_func = util._actualfunc(func0, prop_getter)
+		try:
+			actual_func_ref = _weakref(actual_func)
+		except TypeError:
+			actual_func_ref = lambda: actual_func
+		entries[key] = (actual_func_ref,
+				getattr(actual_func, '__annotations__', None), res)
+	return res
+
+def _clear_funcsigtypes_cache():
+	'''Must be called whenever previously resolved signatures might have become
+	outdated, i.e. if stub classes were (re-)matched or forward references resolved.
+	'''
+	_funcsigtypes_cache.clear()
+	_funcsigtypes_cache_strong.clear()
+
 def _issubclass_Mapping_covariant(subclass, superclass):
 	# This subclass-check treats Mapping-values as covariant
 	if isinstance(subclass, GenericMeta):
@@ -594,7 +1098,7 @@ def _issubclass_Generic(subclass, superclass):
 							break
 					else:
 						# Invariant -- p_cls and p_self must equal.
-						if p_self != p_cls:
+						if not p_self is p_cls and p_self != p_cls:
 							break
 				else:
 					# If the origin's parameter is not a typevar,
@@ -713,7 +1217,53 @@ def _has_base(cls, base):
 			return True
 	return False
 
+def _subtype_cache_generation():
+	gen = (pytypes.apply_numeric_tower, pytypes.covariant_Mapping,
+			pytypes.strict_unknown_check, pytypes.check_unbound_types)
+	# registering virtual subclasses of ABCs changes issubclass results
+	return gen + (_get_abc_cache_token(),)
+
 def _issubclass(subclass, superclass):
+	'''Cached version of _issubclass_uncached. Verdicts are kept in a bounded LRU-cache
+	(see pytypes.subtype_cache_size) that is dropped whenever flags affecting subtype
+	checks, e.g. apply_numeric_tower, change.
+	'''
+	global _subtype_cache_gen
+	gen = _subtype_cache_generation()
+	if gen != _subtype_cache_gen:
+		_subtype_cache.clear()
+		_subtype_cache_gen = gen
+	key = (subclass, superclass)
+	try:
+		res = _subtype_cache[key]
+	except KeyError:
+		pass
+	except TypeError:
+		# unhashable
+		return _issubclass_uncached(subclass, superclass)
+	else:
+		try:
+			_subtype_cache.move_to_end(key)
+		except AttributeError:
+			# Python 2
+			_subtype_cache.pop(key, None)
+			_subtype_cache[key] = res
+		except KeyError:
+			# evicted by another thread in the meantime
+			pass
+		return res
+	res = _issubclass_uncached(subclass, superclass)
+	if pytypes.subtype_cache_size > 0:
+		_subtype_cache[key] = res
+		while len(_subtype_cache) > pytypes.subtype_cache_size:
+			try:
+				_subtype_cache.popitem(False)
+			except KeyError:
+				# emptied by another thread in the meantime
+				break
+	return res
+
+def _issubclass_uncached(subclass, superclass):
 	if superclass is Any:
 		return True
 	if subclass is Any:
@@ -726,6 +1276,10 @@ def _issubclass(subclass, superclass):
 			return True
 	if superclass in _extra_dict:
 		superclass = _extra_dict[superclass]
+	if not _numpy_ndarray() is None and _has_NDArray(subclass) and \
+			not _has_NDArray(superclass):
+		# Apart from NDArray declarations, arrays are checked as plain numpy.ndarray
+		subclass = _strip_NDArray(subclass)
 	try:
 		if _issubclass_2(subclass, Empty):
 			if _issubclass_2(superclass, Container):
@@ -733,7 +1287,8 @@ def _issubclass(subclass, superclass):
 			try:
 				if _issubclass_2(superclass.__origin__, Container):
 					return _issubclass_2(subclass.__args__[0], superclass.__origin__)
-			except TypeError:
+			except (TypeError, AttributeError):
+				# AttributeError: superclass is a plain, non-container class
 				pass
 	except TypeError:
 		pass
@@ -796,9 +1351,204 @@ def _isinstance(obj, cls):
 			return _issubclass(itp, cls.__args__[0])
 	if isinstance(cls, CallableMeta):
 		return _isinstance_Callable(obj, cls)
-	if obj == {}:
+	ndarray = _numpy_ndarray()
+	# comparing arrays is elementwise
+	if (ndarray is None or not isinstance(obj, ndarray)) and obj == {}:
 		return issubclass(typing.Dict, cls.__origin__)
-	return _issubclass(deep_type(obj), cls)
+	return _issubclass(_deep_type_for_checks(obj), cls)
+
+def _deep_type_kind(tp):
+	'''Classifies how deep_type treats objects of exactly the type tp:
+	0: deep_type(obj) is tp
+	1: deep_type(obj) is tp unless obj is empty
+	2: list, set or dict; deep_type(obj) is made of the item types
+	3: tuple
+	4: anything else
+	Kinds 0 and 1 also imply that obj == {} is False.
+	'''
+	try:
+		return _deep_type_kinds[tp]
+	except (KeyError, TypeError):
+		pass
+	if tp in _atomic_types:
+		kind = 0
+	elif tp in _atomic_container_types:
+		kind = 1
+	elif tp is list or tp is set or tp is dict:
+		kind = 2
+	elif tp is tuple:
+		kind = 3
+	elif tp is types.GeneratorType or isinstance(tp, GenericMeta) or hasattr(tp, '__origin__') \
+			or getattr(tp, '__eq__', None) is not getattr(object, '__eq__', None) \
+			or (sys.version_info.major == 2 and tp is types.InstanceType):
+		kind = 4
+	else:
+		try:
+			kind = 4 if _issubclass_2(tp, Container) else 0
+		except TypeError:
+			kind = 4
+	try:
+		_deep_type_kinds[tp] = kind
+	except TypeError:
+		# no weak references to tp
+		pass
+	return kind
+
+def _exact_accepted_types(tp):
+	'''Returns a tuple of classes such that an object of exactly one of these types
+	is surely an instance of tp in the sense of _isinstance. An empty tuple denotes Any.
+	Returns None if tp is not simple enough for this.
+	'''
+	if tp is Any:
+		return ()
+	if is_Union(tp):
+		res = []
+		for t in get_Union_params(tp):
+			tps = _exact_accepted_types(t)
+			if not tps:
+				return None
+			res.extend(tps)
+		return tuple(res)
+	try:
+		if isclass(tp) and _deep_type_kind(tp) < 2:
+			return (tp,)
+	except TypeError:
+		pass
+	return None
+
+def _items_deep_type(items):
+	'''Returns the union of the deep types of the given items, as deep_type would
+	build it, if it can be derived from the distinct item types, otherwise None.
+	'''
+	tps = set(map(type, items))
+	for tp in tps:
+		kind = _deep_type_kind(tp)
+		if kind == 1:
+			for item in items:
+				if type(item) is tp and len(item) == 0:
+					return None
+		elif kind != 0:
+			return None
+	return make_Union(tuple(tps))
+
+def _is_fingerprintable(argSig, arg_types):
+	'''Tells whether checking arguments of the given types against argSig yields
+	the same verdict for all arguments of exactly these types, i.e. without
+	considering their contents.
+	'''
+	try:
+		res = _fingerprint_sigs[argSig]
+	except KeyError:
+		# callables are checked by their own signature
+		res = not _has_Callable(argSig)
+		_fingerprint_sigs[argSig] = res
+	if not res:
+		return False
+	if argSig is Any:
+		return True
+	prms = get_Tuple_params(argSig)
+	if prms is None or len(prms) != len(arg_types):
+		return False
+	for i in range(len(arg_types)):
+		tp = arg_types[i]
+		# classes are not checked by their type, e.g. for Type[...]
+		if issubclass(tp, type):
+			return False
+		kind = _deep_type_kind(tp)
+		if kind == 1:
+			# must not depend on emptiness
+			if not (_issubclass(tp, prms[i]) and
+					_issubclass(_make_Generic(Empty, tp), prms[i])):
+				return False
+		elif kind != 0:
+			return False
+	return True
+
+def _deep_issubclass(obj, tp):
+	return _issubclass(_deep_type_for_checks(obj), tp)
+
+def _compile_type(tp, nested = False):
+	fallback = _deep_issubclass if nested else _isinstance
+	if not nested and (isinstance(tp, CallableMeta) or
+			(isinstance(tp, GenericMeta) and tp.__origin__ is typing.Iterable)):
+		return lambda obj: _isinstance(obj, tp)
+	if isinstance(tp, TupleMeta):
+		prms = get_Tuple_params(tp)
+		if not prms is None and len(prms) > 0 and not prms[-1] is Ellipsis and \
+				not getattr(tp, '__tuple_use_ellipsis__', False):
+			length = len(prms)
+			elements = tuple(_compiled_type(t, True) for t in prms)
+			def check_Tuple(obj):
+				if type(obj) is tuple:
+					if len(obj) != length:
+						return False
+					for i in range(length):
+						if not elements[i](obj[i]):
+							return False
+					return True
+				return fallback(obj, tp)
+			return check_Tuple
+	exact = _exact_accepted_types(tp)
+	if not exact:
+		exact = ()
+	def check(obj):
+		tp_obj = type(obj)
+		if tp_obj in exact:
+			return True
+		kind = _deep_type_kind(tp_obj)
+		if kind == 0 or kind == 1 and len(obj) > 0:
+			return _issubclass(tp_obj, tp)
+		if kind == 2 and len(obj) > 0:
+			if tp_obj is dict:
+				ktp = _items_deep_type(obj.keys())
+				vtp = None if ktp is None else _items_deep_type(obj.values())
+				if not vtp is None:
+					return _issubclass(_make_Generic(Dict, (ktp, vtp)), tp)
+			else:
+				itp = _items_deep_type(obj)
+				if not itp is None:
+					return _issubclass(_make_Generic(List if tp_obj is list else Set, itp), tp)
+		return fallback(obj, tp)
+	return check
+
+def compile_type(tp):
+	'''Compiles tp into a predicate pred(obj) that is equivalent to is_of_type(obj, tp).
+	Unlike is_of_type, the predicate avoids to build the deep type of obj where possible,
+	e.g. a list is checked via the set of distinct item types rather than via a Union
+	of all items. Compiled predicates are cached per type.
+	'''
+	return _compiled_type(tp, False)
+
+def _compiled_type(tp, nested):
+	# nested: check like _issubclass(deep_type(obj), tp), i.e. as part of a Tuple
+	key = (tp, nested)
+	try:
+		res = _compiled_types[key]
+	except KeyError:
+		pass
+	except TypeError:
+		return _compile_type(tp, nested)
+	else:
+		try:
+			_compiled_types.move_to_end(key)
+		except AttributeError:
+			# Python 2
+			_compiled_types.pop(key, None)
+			_compiled_types[key] = res
+		except KeyError:
+			# evicted by another thread in the meantime
+			pass
+		return res
+	res = _compile_type(tp, nested)
+	if pytypes.compiled_type_cache_size > 0:
+		_compiled_types[key] = res
+		while len(_compiled_types) > pytypes.compiled_type_cache_size:
+			try:
+				_compiled_types.popitem(False)
+			except KeyError:
+				# emptied by another thread in the meantime
+				break
+	return res
 
 def _make_generator_error_message(tp, gen, expected_tp, incomp_text):
 	_cmp_msg_format = 'Expected: %s\nReceived: %s'
@@ -813,18 +1563,21 @@ def generator_checker_py3(gen, gen_type):
 		while True:
 			a = gen.send(sn)
 			if initialized or not a is None:
-				if not gen_type.__args__[0] is Any and not _isinstance(a, gen_type.__args__[0]):
+				if not gen_type.__args__[0] is Any and \
+						not _budgeted_isinstance(a, gen_type.__args__[0]):
 					raise pytypes.ReturnTypeError(_make_generator_error_message(deep_type(a), gen,
 							gen_type.__args__[0], 'has incompatible yield type'))
 			initialized = True
 			sn = yield a
-			if not gen_type.__args__[1] is Any and not _isinstance(sn, gen_type.__args__[1]):
+			if not gen_type.__args__[1] is Any and \
+					not _budgeted_isinstance(sn, gen_type.__args__[1]):
 				raise pytypes.InputTypeError(_make_generator_error_message(deep_type(sn), gen,
 						gen_type.__args__[1], 'has incompatible send type'))
 	except StopIteration as st:
 		# Python 3:
 		# todo: Check if st.value is always defined (i.e. as None if not present)
-		if not gen_type.__args__[2] is Any and not _isinstance(st.value, gen_type.__args__[2]):
+		if not gen_type.__args__[2] is Any and \
+				not _budgeted_isinstance(st.value, gen_type.__args__[2]):
 				raise pytypes.ReturnTypeError(_make_generator_error_message(deep_type(st.value), gen,
 						gen_type.__args__[2], 'has incompatible return type'))
 		raise st
@@ -835,23 +1588,244 @@ def generator_checker_py2(gen, gen_type):
 	while True:
 		a = gen.send(sn)
 		if initialized or not a is None:
-			if not gen_type.__args__[0] is Any and not _isinstance(a, gen_type.__args__[0]):
+			if not gen_type.__args__[0] is Any and \
+					not _budgeted_isinstance(a, gen_type.__args__[0]):
 				raise pytypes.ReturnTypeError(_make_generator_error_message(deep_type(a), gen,
 						gen_type.__args__[0], 'has incompatible yield type'))
 		initialized  = True
 		sn = yield a
-		if not gen_type.__args__[1] is Any and not _isinstance(sn, gen_type.__args__[1]):
+		if not gen_type.__args__[1] is Any and \
+				not _budgeted_isinstance(sn, gen_type.__args__[1]):
 			raise pytypes.InputTypeError(_make_generator_error_message(deep_type(sn), gen,
 					gen_type.__args__[1], 'has incompatible send type'))
 
+def _make_lazy_error_message(tp, container, position, expected_tp, incomp_text):
+	_cmp_msg_format = 'Expected: %s\nReceived: %s'
+	func0 = util._actualfunc(container._func)
+	fq_func_name = '%s.%s' % (func0.__module__, getattr(func0, '__qualname__', func0.__name__))
+	return '\n  '+fq_func_name+'\n  '+incomp_text+' '+position+':\n'+_cmp_msg_format \
+			% (type_str(expected_tp), type_str(tp))+'\n  (argument passed at '+ \
+			container._call_site+')'
+
+class _LazyCheckedList(MutableSequence):
+	'''Proxy for a list passed as List[T], see pytypes.lazy_container_checking.
+	Items are checked when read or written rather than all at once.
+	Reading an item of wrong type raises InputTypeError, writing one TypeCheckError.
+	'''
+	def __init__(self, lst, lst_type, func, call_site):
+		self._lst = lst
+		self._item_type = lst_type.__args__[0]
+		self._func = func
+		self._call_site = call_site
+		# deep_type considers this, so the proxy passes further List[T] checks as is
+		self.__orig_class__ = lst_type
+
+	def _check(self, item, index, write = False):
+		if not _isinstance(item, self._item_type):
+			msg = _make_lazy_error_message(deep_type(item), self, 'at index %s' % index,
+					self._item_type, 'wrote list item of incompatible type' if write
+					else 'called with list item of incompatible type')
+			raise pytypes.TypeCheckError(msg) if write else pytypes.InputTypeError(msg)
+		return item
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return _LazyCheckedList(self._lst[index], self.__orig_class__,
+					self._func, self._call_site)
+		return self._check(self._lst[index], index)
+
+	def __setitem__(self, index, value):
+		if isinstance(index, slice):
+			value = list(value)
+			for item in value:
+				self._check(item, index, True)
+		else:
+			self._check(value, index, True)
+		self._lst[index] = value
+
+	def __delitem__(self, index):
+		del self._lst[index]
+
+	def __len__(self):
+		return len(self._lst)
+
+	def __iter__(self):
+		for i, item in enumerate(self._lst):
+			yield self._check(item, i)
+
+	def insert(self, index, value):
+		self._check(value, index, True)
+		self._lst.insert(index, value)
+
+	def sort(self, *args, **kw):
+		self._lst.sort(*args, **kw)
+
+	# Copies are plain lists. Items are checked on the way, so none escapes unchecked.
+	def copy(self):
+		return list(self)
+
+	def __add__(self, other):
+		return list(self) + _unwrap_lazy(other)
+
+	def __radd__(self, other):
+		return _unwrap_lazy(other) + list(self)
+
+	def __iadd__(self, other):
+		self.extend(other)
+		return self
+
+	def __mul__(self, n):
+		return list(self) * n
+
+	__rmul__ = __mul__
+
+	def __imul__(self, n):
+		self._lst *= n
+		return self
+
+	def __eq__(self, other):
+		return self._lst == (other._lst if isinstance(other, _LazyCheckedList) else other)
+
+	def __ne__(self, other):
+		return not self == other
+
+	__hash__ = None
+
+	def __repr__(self):
+		return repr(self._lst)
+
+class _LazyCheckedDict(MutableMapping):
+	'''Proxy for a dict passed as Dict[K, V], see pytypes.lazy_container_checking.
+	Keys and values are checked when read or written rather than all at once.
+	Reading an item of wrong type raises InputTypeError, writing one TypeCheckError.
+	'''
+	def __init__(self, dct, dct_type, func, call_site):
+		self._dct = dct
+		self._key_type, self._value_type = dct_type.__args__
+		self._func = func
+		self._call_site = call_site
+		# deep_type considers this, so the proxy passes further Dict[K, V] checks as is
+		self.__orig_class__ = dct_type
+
+	def _check(self, item, tp, position, write = False):
+		if not _isinstance(item, tp):
+			msg = _make_lazy_error_message(deep_type(item), self, position, tp,
+					'wrote dict item of incompatible type' if write
+					else 'called with dict item of incompatible type')
+			raise pytypes.TypeCheckError(msg) if write else pytypes.InputTypeError(msg)
+		return item
+
+	def __getitem__(self, key):
+		return self._check(self._dct[key], self._value_type, 'at key %r' % (key,))
+
+	def __setitem__(self, key, value):
+		self._check(key, self._key_type, 'as key', True)
+		self._check(value, self._value_type, 'at key %r' % (key,), True)
+		self._dct[key] = value
+
+	def __delitem__(self, key):
+		del self._dct[key]
+
+	def __len__(self):
+		return len(self._dct)
+
+	def __iter__(self):
+		for key in self._dct:
+			yield self._check(key, self._key_type, 'as key')
+
+	def __contains__(self, key):
+		return key in self._dct
+
+	# Copies are plain dicts. Items are checked on the way, so none escapes unchecked.
+	def copy(self):
+		return dict(self)
+
+	def __eq__(self, other):
+		return self._dct == (other._dct if isinstance(other, _LazyCheckedDict) else other)
+
+	def __ne__(self, other):
+		return not self == other
+
+	__hash__ = None
+
+	def __repr__(self):
+		return repr(self._dct)
+
+def _unwrap_lazy(obj):
+	'''Returns the list or dict behind a lazy checking proxy, otherwise obj.
+	'''
+	tp = type(obj)
+	if tp is _LazyCheckedList:
+		return obj._lst
+	if tp is _LazyCheckedDict:
+		return obj._dct
+	return obj
+
+def _member_key(memb):
+	# classmethod, staticmethod and property objects don't support weak references
+	if isinstance(memb, (classmethod, staticmethod, property)):
+		return util._actualfunc(memb)
+	return memb
+
+def _member_ref(memb):
+	key = _member_key(memb)
+	try:
+		return _weakref(key)
+	except TypeError:
+		return lambda: key
+
 def _find_typed_base_method(meth, cls):
+	'''Returns the first method named like meth in the MRO of cls that has type hints
+	and the class it was found in, or None, None. Results are cached per class and
+	name as long as no member of that name in the MRO was replaced.
+	'''
 	meth0 = util._actualfunc(meth)
-	for cls1 in util.mro(cls):
-		if hasattr(cls1, meth0.__name__):
-			fmeth = getattr(cls1, meth0.__name__)
+	name = meth0.__name__
+	mro = util.mro(cls)
+	try:
+		entries = _typed_base_method_cache.get(cls)
+		if entries is None and pytypes.typed_base_method_cache_size > 0:
+			if len(_typed_base_method_cache) >= pytypes.typed_base_method_cache_size:
+				_typed_base_method_cache.clear()
+			entries = {}
+			_typed_base_method_cache[cls] = entries
+	except TypeError:
+		# no weak references to cls
+		entries = None
+	if not entries is None:
+		try:
+			member_refs, cls_ref = entries[name]
+		except KeyError:
+			pass
+		else:
+			if len(member_refs) == len(mro):
+				for i in range(len(mro)):
+					if not member_refs[i]() is _member_key(mro[i].__dict__.get(name)):
+						break
+				else:
+					if cls_ref is None:
+						return None, None
+					cls1 = cls_ref()
+					if not cls1 is None:
+						return getattr(cls1, name), cls1
+	res = None, None
+	for cls1 in mro:
+		if hasattr(cls1, name):
+			fmeth = getattr(cls1, name)
 			if has_type_hints(util._actualfunc(fmeth)):
-				return fmeth, cls1
-	return None, None
+				res = fmeth, cls1
+				break
+	if not entries is None:
+		# Only weak references, so entries don't keep cls alive, e.g. via __class__ cells
+		entries[name] = ([_member_ref(cls1.__dict__.get(name)) for cls1 in mro],
+				None if res[1] is None else _weakref(res[1]))
+	return res
+
+def _clear_typed_base_method_cache():
+	'''Must be called whenever members of a class might have been replaced,
+	e.g. by decorating a class or matching a stubfile.
+	'''
+	_typed_base_method_cache.clear()
 
 def annotations_func(func):
 	'''Intended as decorator.
@@ -865,6 +1839,7 @@ def annotations_func(func):
 
 def annotations_class(cls):
 	assert(isclass(cls))
+	_clear_typed_base_method_cache()
 	# To play it safe we avoid to modify the dict while iterating over it,
 	# so we previously cache keys.
 	# For this we don't use keys() because of Python 3.
@@ -890,14 +1865,11 @@ def annotations_module(md):
 			if md is None:
 				return md
 	assert(ismodule(md))
-	if md.__name__ in _annotated_modules and \
-			_annotated_modules[md.__name__] == len(md.__dict__):
-		return md
-	# To play it safe we avoid to modify the dict while iterating over it,
-	# so we previously cache keys.
-	# For this we don't use keys() because of Python 3.
+	# Only members that are new or were replaced since the last run need processing.
+	# The keys are a snapshot, so we don't modify the dict while iterating over it.
 	# Todo: Better use inspect.getmembers here
-	keys = [key for key in md.__dict__]
+	processed = _annotated_modules.get(md.__name__, {})
+	keys = util._unprocessed_members(md, processed)
 	for key in keys:
 		memb = md.__dict__[key]
 		if (isfunction(memb) or ismethod(memb) or ismethoddescriptor(memb)) \
@@ -905,7 +1877,8 @@ def annotations_module(md):
 			annotations_func(memb)
 		elif isclass(memb) and memb.__module__ == md.__name__:
 			annotations_class(memb)
-	_annotated_modules[md.__name__] = len(md.__dict__)
+	util._mark_processed(md, keys, processed)
+	_annotated_modules[md.__name__] = processed
 	return md
 
 def annotations(memb):
@@ -920,8 +1893,9 @@ def annotations(memb):
 	return memb
 
 def _catch_up_global_annotations():
-	for mod_name in sys.modules:
-		if not mod_name in _annotated_modules:
+	for mod_name in list(sys.modules):
+		if not mod_name in _annotated_modules and \
+				util._global_mode_applies('annotations', mod_name):
 			try:
 				md = sys.modules[mod_name]
 			except KeyError:
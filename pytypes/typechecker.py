@@ -4,13 +4,15 @@ Created on 20.08.2016
 @author: Stefan Richthofer
 '''
 
-import sys, typing, types, inspect, re as _re, atexit
+import sys, typing, types, inspect, functools, re as _re, atexit
+from collections import OrderedDict
 from inspect import isclass, ismodule, isfunction, ismethod, ismethoddescriptor
-from .stubfile_manager import _match_stub_type, _re_match_module
+from .stubfile_manager import _match_stub_type, _re_match_module, as_stub_func_if_any, \
+		_stub_modules_loading
 from .util import getargspecs, _actualfunc
 from .type_util import type_str, has_type_hints, _has_type_hints, is_builtin_type, \
-		deep_type, _funcsigtypes, _issubclass, _isinstance, _get_types, \
-		_find_typed_base_method
+		deep_type, _funcsigtypes, _funcsigtypes_matched, _issubclass, _isinstance, \
+		_get_types, _find_typed_base_method, compile_type
 from .typelogger import log_type
 from . import util, type_util, InputTypeError, ReturnTypeError, OverrideError
 import pytypes
@@ -20,54 +22,141 @@ if sys.version_info.major >= 3:
 else:
 	import __builtin__ as builtins
 
+try:
+	_iscoroutine = inspect.iscoroutine
+except AttributeError:
+	# No native coroutines before Python 3.5
+	def _iscoroutine(obj):
+		return False
+
 not_type_checked = set()
 _fully_typechecked_modules = {}
 _auto_override_modules = {}
 _fully_typelogged_modules = {}
 
 _delayed_checks = []
+# Whether override checks ran at class definition time, so that later modules may
+# register delayed checks while they are executed
+_definition_time_overrides = False
 
-# Monkeypatch import to
-# process forward-declarations after module loading finished
-# and eventually apply global typechecking:
-python___import__ = builtins.__import__
-def pytypes___import__(name, *x):
-	res = python___import__(name, *x)
-	if sys.version_info.major >= 3:
-		if (len(x) >= 3):
-			if x[2] is None:
-				_re_match_module(name, True)
-			else:
-				for mod_name in x[2]:
-					mod_name_full = name+'.'+mod_name
-					if mod_name_full in sys.modules:
-						_re_match_module(mod_name_full, True)
+# Call counts and check times per function regarding pytypes.check_policy_recording
+_check_policy_records = {}
+# Call counts per call site and function regarding pytypes.call_site_checking
+_call_sites = OrderedDict()
+# Filename and actions per function of the check policy currently in use
+_check_policy = [None, None]
+_check_policy_actions = ('check', 'sample', 'skip')
+
+def _import_hook_active():
+	'''Tells whether modules need post-processing after loading, i.e. whether
+	a global mode is set, override checks are or might get delayed or stub files
+	are still to be matched.
+	'''
+	return pytypes.global_checking or pytypes.global_auto_override or \
+			pytypes.global_annotations or pytypes.global_typelog or \
+			len(_delayed_checks) > 0 or len(_stub_modules_loading) > 0 or \
+			(_definition_time_overrides and pytypes.check_override_at_class_definition_time)
+
+def _process_loaded_module(name, force_recursive = False):
+	'''Processes the module name right after it was loaded, i.e. completes
+	matching its stub file, processes forward-declarations and eventually applies
+	global typechecking, typelogging, auto_override and annotations.
+	force_recursive is passed on to typechecked_module and auto_override_module.
+	'''
+	md = sys.modules.get(name)
+	if not md is None and ismodule(md):
+		if sys.version_info.major >= 3:
+			_re_match_module(name, True)
 	_run_delayed_checks(True, name)
-	if pytypes.global_checking or pytypes.global_auto_override or \
-			pytypes.global_annotations or pytypes.global_typelog:
-		if (len(x) >= 3):
-			if x[2] is None:
-				if name in sys.modules:
-					if pytypes.global_checking:
-						typechecked_module(name)
-					if pytypes.global_typelog:
-						typelogged_module(name)
-					if pytypes.global_auto_override:
-						auto_override_module(name)
-					if pytypes.global_annotations:
-						type_util.annotations_module(name)
+	if md is None or not ismodule(md):
+		return
+	if pytypes.global_checking and util._global_mode_applies('checking', name):
+		typechecked_module(name, force_recursive)
+	if pytypes.global_typelog and util._global_mode_applies('typelog', name):
+		typelogged_module(name)
+	if pytypes.global_auto_override and util._global_mode_applies('auto_override', name):
+		auto_override_module(name, force_recursive)
+	if pytypes.global_annotations and util._global_mode_applies('annotations', name):
+		type_util.annotations_module(name)
+
+class _PytypesLoader(object):
+	'''Wraps the loader of a module to call _process_loaded_module once the
+	module was executed. Before execution the original loader is restored in
+	the module and its spec, so the wrapper won't be visible afterwards.
+	'''
+	def __init__(self, loader):
+		self.loader = loader
+
+	def __getattr__(self, name):
+		return getattr(self.loader, name)
+
+	def create_module(self, spec):
+		try:
+			create_module = self.loader.create_module
+		except AttributeError:
+			return None
+		return create_module(spec)
+
+	def exec_module(self, module):
+		spec = getattr(module, '__spec__', None)
+		if not spec is None and spec.loader is self:
+			spec.loader = self.loader
+		if getattr(module, '__loader__', None) is self:
+			module.__loader__ = self.loader
+		self.loader.exec_module(module)
+		_process_loaded_module(module.__name__ if spec is None else spec.name)
+
+class _PytypesFinder(object):
+	'''Meta path finder that looks a module up via the finders behind it, like
+	importlib.util.find_spec would do, and wraps the loader of the resulting spec
+	into a _PytypesLoader. Does nothing if _import_hook_active tells so.
+	'''
+	def find_spec(self, fullname, path, target = None):
+		if not _import_hook_active():
+			return None
+		meta_path = sys.meta_path
+		try:
+			pos = meta_path.index(self)
+		except ValueError:
+			return None
+		for finder in meta_path[pos+1:]:
+			try:
+				find_spec = finder.find_spec
+			except AttributeError:
+				# legacy finder
+				find_module = getattr(finder, 'find_module', None)
+				if find_module is None:
+					continue
+				loader = find_module(fullname, path)
+				spec = None if loader is None else _spec_from_loader(fullname, loader)
 			else:
-				for mod_name in x[2]:
-					mod_name_full = name+'.'+mod_name
-					if mod_name_full in sys.modules:
-						if pytypes.global_checking:
-							typechecked_module(mod_name_full, True)
-						if pytypes.global_auto_override:
-							auto_override_module(mod_name_full, True)
-						if pytypes.global_annotations:
-							type_util.annotations_module(mod_name_full)
-	return res
-builtins.__import__ = pytypes___import__
+				spec = find_spec(fullname, path, target)
+			if not spec is None:
+				if hasattr(spec.loader, 'exec_module'):
+					spec.loader = _PytypesLoader(spec.loader)
+				return spec
+		return None
+
+if sys.version_info.major >= 3:
+	from importlib.util import spec_from_loader as _spec_from_loader
+
+	sys.meta_path.insert(0, _PytypesFinder())
+else:
+	# Monkeypatch import to process modules after loading
+	python___import__ = builtins.__import__
+	def pytypes___import__(name, *x):
+		res = python___import__(name, *x)
+		if len(x) >= 3 and not x[2] is None:
+			# covers the delayed checks of the submodules as well
+			_run_delayed_checks(True, name)
+			for mod_name in x[2]:
+				mod_name_full = name+'.'+mod_name
+				if mod_name_full in sys.modules:
+					_process_loaded_module(mod_name_full, True)
+		else:
+			_process_loaded_module(name)
+		return res
+	builtins.__import__ = pytypes___import__
 
 class _DelayedCheck():
 	def __init__(self, func, method, class_name, base_method, base_class, exc_info):
@@ -107,6 +196,9 @@ def _run_delayed_checks(raise_NameError = False, module_name = None):
 			else:
 				new_delayed_checks.append(check)
 		_delayed_checks = new_delayed_checks
+	if len(to_run) > 0:
+		# Delayed checks indicate forward references that might be resolvable now
+		type_util._clear_funcsigtypes_cache()
 	for check in to_run:
 		check.run_check(raise_NameError)
 
@@ -332,9 +424,11 @@ def override(func, auto = False):
 	#   This is difficult to achieve in case of a call to super. Runtime-override checking
 	#   would use the subclass-self and thus unintentionally would also check the submethod's
 	#   signature. We actively avoid this here.
+	global _definition_time_overrides
 	func.override_checked = True
 	_actualfunc(func).override_checked = True
 	if pytypes.check_override_at_class_definition_time:
+		_definition_time_overrides = True
 		# We need some trickery here, because details of the class are not yet available
 		# as it is just getting defined. Luckily we can get base-classes via inspect.stack():
 		stack = inspect.stack()
@@ -405,10 +499,13 @@ def override(func, auto = False):
 	if pytypes.check_override_at_runtime:
 		specs = util.getargspecs(func)
 		argNames = util.getargnames(specs)
+		getargskw = util._make_argskw_binder(specs)
 		def checker_ov(*args, **kw):
 			if hasattr(checker_ov, '__annotations__') and len(checker_ov.__annotations__) > 0:
 				checker_ov.ov_func.__annotations__ = checker_ov.__annotations__
-			args_kw = util.getargskw(args, kw, specs)
+			if type_util._is_unchecked():
+				return func(*args, **kw)
+			args_kw = getargskw(args, kw)
 			if len(argNames) > 0 and argNames[0] == 'self':
 				if hasattr(args_kw[0].__class__, func.__name__) and \
 						ismethod(getattr(args_kw[0], func.__name__)):
@@ -490,7 +587,7 @@ def _make_type_error_message(tp, func, slf, func_class, expected_tp, \
 	return '\n  '+fq_func_name+'\n  '+incomp_text+':\n'+_cmp_msg_format \
 			% (type_str(expected_tp), type_str(tp))
 
-def _checkinstance(obj, cls, is_args, func, force = False):
+def _checkinstance(obj, cls, is_args, func, force = False, lazy = None):
 	if isinstance(cls, typing.TupleMeta):
 		prms = pytypes.get_Tuple_params(cls)
 		try:
@@ -501,7 +598,7 @@ def _checkinstance(obj, cls, is_args, func, force = False):
 		lst = []
 		if isinstance(obj, tuple):
 			for i in range(len(obj)):
-				res, obj2 = _checkinstance(obj[i], prms[i], is_args, func)
+				res, obj2 = _checkinstance(obj[i], prms[i], is_args, func, force, lazy)
 				if not res:
 					return False, obj
 				else:
@@ -522,6 +619,12 @@ def _checkinstance(obj, cls, is_args, func, force = False):
 			return True, typechecked_func(obj, force, pytypes.make_Tuple(clb_args), clb_res)
 		return True, obj
 	if isinstance(cls, typing.GenericMeta):
+		if is_args and (pytypes.lazy_container_checking if lazy is None else lazy):
+			# pass proxies that check items on access
+			if cls.__origin__ is typing.List and type(obj) is list:
+				return True, type_util._LazyCheckedList(obj, cls, func, util._call_site())
+			if cls.__origin__ is typing.Dict and type(obj) is dict:
+				return True, type_util._LazyCheckedDict(obj, cls, func, util._call_site())
 		if cls.__origin__ is typing.Iterable:
 			if not pytypes.check_iterables:
 				return _isinstance(obj, cls), obj
@@ -572,7 +675,7 @@ def _checkinstance(obj, cls, is_args, func, force = False):
 					return True, obj
 			else:
 				return False, obj
-	return _isinstance(obj, cls), obj
+	return compile_type(cls)(obj), obj
 
 def _preprocess_typecheck(argSig, argspecs, slf_or_clsm = False):
 	# todo: Maybe move also slf-logic here
@@ -594,7 +697,7 @@ def _preprocess_typecheck(argSig, argspecs, slf_or_clsm = False):
 			# checked against a parent's type-info with the child featuring
 			# a more wider type on signature level (e.g. adding vargs)
 			try:
-				vargs_type = typing.Sequence[arg_type_lst[vargs_pos]]
+				vargs_type = type_util._make_Generic(typing.Sequence, arg_type_lst[vargs_pos])
 			except IndexError:
 				vargs_type = typing.Sequence[typing.Any]
 			try:
@@ -610,46 +713,203 @@ def _preprocess_typecheck(argSig, argspecs, slf_or_clsm = False):
 			if not kwonly is None:
 				kw_pos += len(kwonly)
 			try:
-				kw_type = typing.Dict[str, arg_type_lst[kw_pos]]
+				kw_type = type_util._make_Generic(typing.Dict, (str, arg_type_lst[kw_pos]))
 			except IndexError:
 				kw_type = typing.Dict[str, typing.Any]
 			try:
 				arg_type_lst[kw_pos] = kw_type
 			except IndexError:
 				arg_type_lst.append(kw_type)
-		return typing.Tuple[tuple(arg_type_lst)]
+		return type_util.make_Tuple(tuple(arg_type_lst))
 	else:
 		return argSig
 
 def _checkfunctype(argSig, check_val, func, slf, func_class, make_checked_val = False, \
-			prop_getter = False, argspecs = None, var_type = None):
+			prop_getter = False, argspecs = None, var_type = None, sampling = None, lazy = None,
+			fingerprints = None):
 	if argspecs is None:
 		argspecs = getargspecs(_actualfunc(func, prop_getter))
 	argSig = _preprocess_typecheck(argSig, argspecs, slf) \
 			if var_type is None else var_type
-	if make_checked_val:
-		result, checked_val = _checkinstance(check_val, argSig, True, func)
-	else:
-		result = _isinstance(check_val, argSig)
-		checked_val = None
+	if not fingerprints is None:
+		# Shallow argument types that passed before need no deep check,
+		# as long as the flags affecting subtype checks are unchanged
+		fingerprint = (argSig, tuple(map(type, check_val)))
+		gen = type_util._subtype_cache_generation()
+		known = fingerprints.get(fingerprint)
+		if not known is None and known[0] == gen and known[1]:
+			return check_val if make_checked_val else None
+	prev_sampling = type_util._set_sampling(sampling)
+	try:
+		if make_checked_val:
+			result, checked_val = _checkinstance(check_val, argSig, True, func, lazy = lazy)
+		else:
+			result = compile_type(argSig)(check_val)
+			checked_val = None
+	finally:
+		type_util._restore_sampling(prev_sampling)
 	if not result:
-		raise InputTypeError(_make_type_error_message(deep_type(check_val), func,
-				slf, func_class, argSig, 'called with incompatible types', prop_getter))
+		raise InputTypeError(_make_type_error_message(deep_type(check_val, sampling = False),
+				func, slf, func_class, argSig, 'called with incompatible types', prop_getter)
+				+type_util._sampling_note())
+	if not fingerprints is None and pytypes.fingerprint_cache_size > 0 and \
+			(known is None or known[0] != gen):
+		# also remember shapes that need deep checks, to not test this again
+		if len(fingerprints) >= pytypes.fingerprint_cache_size:
+			fingerprints.clear()
+		fingerprints[fingerprint] = (gen, type_util._is_fingerprintable(argSig, fingerprint[1]))
 	return checked_val
 
 def _checkfuncresult(resSig, check_val, func, slf, func_class, \
-			make_checked_val = False, prop_getter = False):
-	if make_checked_val:
-		result, checked_val = _checkinstance(check_val, _match_stub_type(resSig), False, func)
-	else:
-		result = _isinstance(check_val, _match_stub_type(resSig))
-		checked_val = None
+			make_checked_val = False, prop_getter = False, sampling = None):
+	prev_sampling = type_util._set_sampling(sampling)
+	try:
+		if make_checked_val:
+			result, checked_val = _checkinstance(check_val, _match_stub_type(resSig), False, func)
+		else:
+			result = compile_type(_match_stub_type(resSig))(check_val)
+			checked_val = None
+	finally:
+		type_util._restore_sampling(prev_sampling)
 	if not result:
 		# todo: constrain deep_type-depth
-		raise ReturnTypeError(_make_type_error_message(deep_type(check_val), func,
-				slf, func_class, resSig, 'returned incompatible type', prop_getter))
+		raise ReturnTypeError(_make_type_error_message(deep_type(check_val, sampling = False),
+				func, slf, func_class, resSig, 'returned incompatible type', prop_getter)
+				+type_util._sampling_note())
 	return checked_val
 
+def _adaptive_check_due(state, policy, shape):
+	'''Counts a call in the adaptive checking state of a wrapper, i.e. in
+	[calls, consecutive passes, calls left to check fully, calls since last check,
+	known argument types], and tells whether the call shall be checked.
+	'''
+	n, k, m, p = policy
+	state[0] += 1
+	shapes = state[4]
+	if pytypes.adaptive_shape_cache_size > 0 and not shape in shapes:
+		if len(shapes) >= pytypes.adaptive_shape_cache_size:
+			shapes.clear()
+		shapes.add(shape)
+		state[2] = max(p, 1)
+	if state[0] <= n or state[2] > 0 or state[1] < k or state[3]+1 >= m:
+		state[3] = 0
+		if state[2] > 0:
+			state[2] -= 1
+		return True
+	state[3] += 1
+	return False
+
+def _adaptive_violation(state, policy):
+	state[1] = 0
+	state[2] = policy[3]
+
+def _boundary_package(module_name):
+	for pkg in pytypes.boundary_packages:
+		if module_name == pkg or module_name.startswith(pkg+'.'):
+			return pkg
+	if pytypes.boundary_package_depth is None:
+		return module_name
+	return '.'.join(module_name.split('.')[:pytypes.boundary_package_depth])
+
+def _is_internal_call(caller_module, module_name):
+	'''Tells whether a call from caller_module to a function of module_name stays
+	within a package in terms of pytypes.check_boundaries_only.
+	'''
+	if caller_module == module_name:
+		return True
+	if caller_module is None:
+		return False
+	return _boundary_package(caller_module) == _boundary_package(module_name)
+
+def _call_site_check_due(frame, func0, policy):
+	'''Counts a call of func0 from the call site given by frame and tells whether
+	it shall be checked according to the policy (n, m); see pytypes.call_site_checking.
+	'''
+	n, m = policy
+	key = (frame.f_code, frame.f_lasti, func0)
+	try:
+		count = _call_sites[key]
+	except KeyError:
+		count = [0]
+		if pytypes.call_site_table_size > 0:
+			_call_sites[key] = count
+			while len(_call_sites) > pytypes.call_site_table_size:
+				try:
+					_call_sites.popitem(False)
+				except KeyError:
+					# emptied by another thread in the meantime
+					break
+	else:
+		try:
+			_call_sites.move_to_end(key)
+		except AttributeError:
+			# Python 2
+			_call_sites.pop(key, None)
+			_call_sites[key] = count
+		except KeyError:
+			# evicted by another thread in the meantime
+			pass
+	count[0] += 1
+	# m = 0 means not to check anymore after n calls
+	return count[0] <= n or (m > 0 and (count[0]-n) % m == 0)
+
+def _check_policy_name(func0):
+	return func0.__module__+'.'+getattr(func0, '__qualname__', func0.__name__)
+
+def _record_check_time(start, budget, record):
+	elapsed = type_util._perf_counter()-start
+	if budget:
+		type_util._check_budget_state[1] += elapsed
+	if not record is None:
+		record[1] += elapsed
+
+def write_check_policy(filename, skip_time = 1.0, sample_time = 0.1):
+	'''Writes a check policy file for use as pytypes.check_policy_file, based on
+	what was recorded with pytypes.check_policy_recording. Functions that spent at
+	least skip_time seconds in checks are marked as 'skip', those that spent at least
+	sample_time seconds are marked as 'sample', the others as 'check'.
+	The file is meant to be reviewed and edited; it lists one function per line.
+	'''
+	lines = ['# pytypes check policy',
+			'# action, function, recorded calls, recorded check time in seconds']
+	for name in sorted(_check_policy_records):
+		calls, check_time = _check_policy_records[name]
+		if check_time >= skip_time:
+			action = 'skip'
+		elif check_time >= sample_time:
+			action = 'sample'
+		else:
+			action = 'check'
+		lines.append('%s %s %d %.6f' % (action, name, calls, check_time))
+	with open(filename, 'w') as policy_file:
+		policy_file.write('\n'.join(lines)+'\n')
+
+def _load_check_policy(filename):
+	actions = {}
+	with open(filename) as policy_file:
+		for lineno, line in enumerate(policy_file):
+			line = line.strip()
+			if len(line) == 0 or line.startswith('#'):
+				continue
+			parts = line.split()
+			if len(parts) < 2 or not parts[0] in _check_policy_actions:
+				raise ValueError('Invalid check policy entry in %s, line %d: %s'
+						% (filename, lineno+1, line))
+			actions[parts[1]] = parts[0]
+	return actions
+
+def _check_policy_action(func0):
+	'''Returns the action pytypes.check_policy_file assigns to func0, i.e.
+	'check', 'sample' or 'skip'.
+	'''
+	filename = pytypes.check_policy_file
+	if not filename:
+		return 'check'
+	if _check_policy[0] != filename:
+		_check_policy[1] = _load_check_policy(filename)
+		_check_policy[0] = filename
+	return _check_policy[1].get(_check_policy_name(func0), 'check')
+
 # This is just a stub for now
 def typelogged_func(func):
 	#log_type
@@ -666,7 +926,8 @@ def typelogged_func(func):
 
 # Todo: Rename to something that better indicates this is also applicable to some descriptors,
 #       e.g. to typechecked_member
-def typechecked_func(func, force = False, argType = None, resType = None, prop_getter = False):
+def typechecked_func(func, force = False, argType = None, resType = None, prop_getter = False,
+			codegen = None, sampling = None, lazy = None, adaptive = None):
 	if not pytypes.checking_enabled and not pytypes.do_logging_in_typechecked:
 		return func
 	assert(isfunction(func) or ismethod(func) or ismethoddescriptor(func)
@@ -678,12 +939,142 @@ def typechecked_func(func, force = False, argType = None, resType = None, prop_g
 		return func
 	elif hasattr(func, 'do_logging'):
 		# actually shouldn't happen
-		return _typeinspect_func(func, True, func.do_logging, argType, resType, prop_getter)
+		return _typeinspect_func(func, True, func.do_logging, argType, resType, prop_getter,
+				sampling, lazy, adaptive)
 	else:
-		return _typeinspect_func(func, True, False, argType, resType, prop_getter)
+		action = _check_policy_action(_actualfunc(func, prop_getter))
+		if action == 'skip':
+			return func
+		if action == 'sample' and adaptive is None:
+			adaptive = pytypes.check_policy_sampling
+		if codegen is None:
+			codegen = pytypes.typecheck_codegen
+		if codegen and argType is None and resType is None and not prop_getter \
+				and sampling is None and lazy is None and adaptive is None \
+				and not _generic_checker_needed():
+			checker_cg = _codegen_typechecked_func(func)
+			if not checker_cg is None:
+				return checker_cg
+		return _typeinspect_func(func, True, False, argType, resType, prop_getter, sampling, lazy,
+				adaptive)
+
+def _generic_checker_needed():
+	'''Tells whether global settings are active that only the generic checker
+	implements, i.e. typelogging or a policy that skips or measures checks.
+	Codegen wrappers consult this on each call.
+	'''
+	return pytypes.do_logging_in_typechecked or pytypes.adaptive_checking or \
+			pytypes.check_time_budget or pytypes.check_policy_recording or \
+			pytypes.check_boundaries_only or pytypes.call_site_checking
+
+def _codegen_typechecked_func(func):
+	'''Emits a wrapper specialized to the signature of func, with isinstance-like
+	checks inlined for simple types. Parameters of non-simple types are checked via
+	_checkinstance. On any type mismatch the call is delegated to the generic checker,
+	which then raises the proper error. Returns None if func is not suitable, i.e. if it
+	is no plain function or staticmethod with positional-or-keyword args.
+	'''
+	if not (isfunction(func) or type(func) == staticmethod):
+		return None
+	func0 = _actualfunc(func)
+	if not isfunction(func0):
+		return None
+	specs = getargspecs(func0)
+	try:
+		kwonly = specs.kwonlyargs
+	except AttributeError:
+		kwonly = None
+	if not specs.varargs is None or not util._argspec_parts(specs)[3] is None \
+			or kwonly or not util._is_plain_argspec(specs):
+		return None
+	argNames = specs.args
+	if len(argNames) > 0 and argNames[0] in ('self', 'cls'):
+		return None
+	for name in argNames:
+		if name.startswith('_pytypes_'):
+			return None
+	try:
+		if not as_stub_func_if_any(func0, func) is func0:
+			return None
+		argSig, resSig = _funcsigtypes_matched(func, False)
+	except Exception:
+		# e.g. NameError due to a forward reference; leave this to the generic checker
+		return None
+	if not isinstance(argSig, typing.TupleMeta):
+		return None
+	prms = type_util.get_Tuple_params(argSig)
+	if prms is None or len(prms) != len(argNames):
+		return None
+	generic = _typeinspect_func(func, True, False)
+	if type(generic) == staticmethod:
+		generic = generic.__func__
+	namespace = {'_pytypes_type': type, '_pytypes_len': len, '_pytypes_func': func0,
+			'_pytypes_generic': generic, '_pytypes_checkinstance': _checkinstance,
+			'_pytypes_bind': util._make_argskw_binder(specs),
+			'_pytypes_unchecked': type_util._is_unchecked,
+			'_pytypes_generic_needed': _generic_checker_needed,
+			'_pytypes_checkres': lambda res: _checkfuncresult(resSig, res, func, False, None, True)}
+	call = ', '.join(argNames)
+	# calls that do not match the signature are left to the generic checker
+	generic_call = '_pytypes_generic(*_pytypes_args, **_pytypes_kw)'
+	code = ['def %s(*_pytypes_args, **_pytypes_kw):' % func0.__name__,
+			'\tif _pytypes_generic_needed():\n\t\treturn '+generic_call,
+			'\tif _pytypes_unchecked():\n\t\treturn _pytypes_func(*_pytypes_args, **_pytypes_kw)',
+			'\tif _pytypes_kw or _pytypes_len(_pytypes_args) != %d:' % len(argNames),
+			'\t\t_pytypes_args_kw = _pytypes_bind(_pytypes_args, _pytypes_kw)',
+			'\t\tif _pytypes_len(_pytypes_args_kw) != %d:' % len(argNames),
+			'\t\t\treturn '+generic_call]
+	if len(argNames) > 0:
+		unpack = ''.join(name+', ' for name in argNames)
+		code.append('\t\t%s= _pytypes_args_kw' % unpack)
+		code.append('\telse:\n\t\t%s= _pytypes_args' % unpack)
+	conds = []
+	checks = []
+	for i in range(len(argNames)):
+		tps = type_util._exact_accepted_types(prms[i])
+		namespace['_pytypes_t%d' % i] = tps[0] if tps and len(tps) == 1 else \
+				(prms[i] if tps is None else tps)
+		if tps is None:
+			checks.append('\t_pytypes_ok, %s = _pytypes_checkinstance(%s, _pytypes_t%d, True, _pytypes_func)'
+					% (argNames[i], argNames[i], i))
+			checks.append('\tif not _pytypes_ok:\n\t\treturn '+generic_call)
+		elif len(tps) == 1:
+			conds.append('_pytypes_type(%s) is _pytypes_t%d' % (argNames[i], i))
+		elif len(tps) > 1:
+			conds.append('_pytypes_type(%s) in _pytypes_t%d' % (argNames[i], i))
+	if len(conds) > 0:
+		code.append('\tif not (%s):\n\t\treturn %s' % (' and '.join(conds), generic_call))
+	code.extend(checks)
+	code.append('\t_pytypes_res = _pytypes_func(%s)' % call)
+	tps = type_util._exact_accepted_types(resSig)
+	if tps is None:
+		code.append('\treturn _pytypes_checkres(_pytypes_res)')
+	elif len(tps) == 0:
+		code.append('\treturn _pytypes_res')
+	else:
+		namespace['_pytypes_tres'] = tps
+		code.append('\tif _pytypes_type(_pytypes_res) in _pytypes_tres:\n\t\treturn _pytypes_res')
+		code.append('\treturn _pytypes_checkres(_pytypes_res)')
+	exec('\n'.join(code)+'\n', namespace)
+	checker_cg = namespace[func0.__name__]
+	checker_cg.ch_func = func
+	checker_cg.do_typecheck = True
+	checker_cg.do_logging = False
+	if hasattr(func, '__func__'):
+		checker_cg.__func__ = func.__func__
+	checker_cg.__module__ = func0.__module__
+	if hasattr(func0, '__annotations__'):
+		checker_cg.__annotations__ = func0.__annotations__
+	if hasattr(func0, '__qualname__'):
+		checker_cg.__qualname__ = func0.__qualname__
+	checker_cg.__doc__ = func0.__doc__
+	if type(func) == staticmethod:
+		return staticmethod(checker_cg)
+	return checker_cg
 
 def _typeinspect_func(func, do_typecheck, do_logging, \
-			argType = None, resType = None, prop_getter = False):
+			argType = None, resType = None, prop_getter = False, sampling = None, lazy = None,
+			adaptive = None):
 	clsm = isinstance(func, classmethod)
 	stat = isinstance(func, staticmethod)
 	prop = isinstance(func, property)
@@ -691,12 +1082,58 @@ def _typeinspect_func(func, do_typecheck, do_logging, \
 	func0 = _actualfunc(func, prop_getter)
 	specs = getargspecs(func0)
 	argNames = util.getargnames(specs)
+	getargskw = util._make_argskw_binder(specs)
+	fromargskw = (util._make_fromargskw_binder(specs, False),
+			util._make_fromargskw_binder(specs, True))
+	fingerprints = {}
+	policy_name = _check_policy_name(func0)
+	if clsm or stat:
+		backend = func.__func__
+	elif prop:
+		backend = func.fget if prop_getter or func.fset is None else func.fset
+	else:
+		backend = func
 	def checker_tp(*args, **kw):
 		if hasattr(checker_tp, '__annotations__') and len(checker_tp.__annotations__) > 0:
 			checker_tp.ch_func.__annotations__ = checker_tp.__annotations__
+		policy = pytypes.adaptive_checking if adaptive is None else adaptive
+		budget = pytypes.check_time_budget
+		record = None
+		logging = do_logging or (do_typecheck and pytypes.do_logging_in_typechecked)
+		check = do_typecheck and not type_util._is_unchecked()
+		if check and (pytypes.check_boundaries_only or pytypes.call_site_checking):
+			frame = sys._getframe(1)
+			if '_pytypes_generic' in frame.f_globals:
+				# called via a codegen wrapper
+				frame = frame.f_back
+			if pytypes.check_boundaries_only and \
+					_is_internal_call(frame.f_globals.get('__name__'), func0.__module__):
+				check = False
+			elif pytypes.call_site_checking and not _call_site_check_due(
+					frame, func0, pytypes.call_site_checking):
+				check = False
+		if not check or logging:
+			policy = budget = None
+			if not logging:
+				return backend(*args, **kw)
+		elif pytypes.check_policy_recording:
+			try:
+				record = _check_policy_records[policy_name]
+			except KeyError:
+				record = _check_policy_records.setdefault(policy_name, [0, 0.0])
+			record[0] += 1
+		timed = budget or not record is None
+		if policy:
+			shape = (tuple(map(type, args)), tuple((key, type(kw[key])) for key in kw))
+			if not _adaptive_check_due(checker_tp.adaptive_state, policy, shape):
+				return backend(*args, **kw)
+		if budget and not type_util._check_budget_allows(budget):
+			return backend(*args, **kw)
+		if timed:
+			start = type_util._perf_counter()
 		# check consistency regarding special case with 'self'-keyword
 		slf = False
-		args_kw = util.getargskw(args, kw, specs)
+		args_kw = getargskw(args, kw)
 		# Todo: Use argskw_err for better error msg or to fail early
 		# args_kw, argskw_err = util._getargskw(args, kw, specs)
 
@@ -734,10 +1171,10 @@ def _typeinspect_func(func, do_typecheck, do_logging, \
 		elif clsm:
 			parent_class = args_kw[0]
 
-		if do_logging or (do_typecheck and pytypes.do_logging_in_typechecked):
+		if logging:
 			log_type(check_args, func, slf, clsm, parent_class, specs)
-		if not do_typecheck:
-			return func(*args, **kw)
+		if not check:
+			return backend(*args, **kw)
 		else:
 			if pytypes.always_check_parent_types:
 				checkParents = True
@@ -759,25 +1196,31 @@ def _typeinspect_func(func, do_typecheck, do_logging, \
 				toCheck = func
 	
 			if argType is None or resType is None:
-				argSig, resSig = _funcsigtypes(toCheck, slf or clsm,
-						parent_class, None, prop_getter or auto_prop_getter)
-				if argType is None:
-					argSig = _match_stub_type(argSig)
-				else:
+				argSig, resSig = _funcsigtypes_matched(toCheck, slf or clsm,
+						parent_class, prop_getter or auto_prop_getter)
+				if not argType is None:
 					argSig = argType
-				if resType is None:
-					resSig = _match_stub_type(resSig)
-				else:
+				if not resType is None:
 					resSig = resType
 			else:
 				argSig, resSig = argType, resType
+			lazy_args = pytypes.lazy_container_checking if lazy is None else lazy
 			make_checked = pytypes.check_callables or \
-					pytypes.check_iterables or pytypes.check_generators
-			checked_val = _checkfunctype(argSig, check_args,
-					toCheck, slf or clsm, parent_class, make_checked,
-					prop_getter or auto_prop_getter, specs)
+					pytypes.check_iterables or pytypes.check_generators or lazy_args
+			try:
+				checked_val = _checkfunctype(argSig, check_args,
+						toCheck, slf or clsm, parent_class, make_checked,
+						prop_getter or auto_prop_getter, specs, sampling = sampling, lazy = lazy,
+						fingerprints = fingerprints)
+			except InputTypeError:
+				if policy:
+					_adaptive_violation(checker_tp.adaptive_state, policy)
+				raise
+			finally:
+				if timed:
+					_record_check_time(start, budget, record)
 			if make_checked:
-				checked_args, checked_kw = util.fromargskw(checked_val, specs, slf or clsm)
+				checked_args, checked_kw = fromargskw[slf or clsm](checked_val)
 			else:
 				checked_args = args
 				checked_kw = kw
@@ -798,14 +1241,30 @@ def _typeinspect_func(func, do_typecheck, do_logging, \
 					res = func(args[0], *checked_args, **checked_kw)
 				else:
 					res = func(*checked_args, **checked_kw)
+			if lazy_args:
+				# don't hand proxies of arguments back to the caller
+				res = type_util._unwrap_lazy(res)
 	
-			checked_res = _checkfuncresult(resSig, res, toCheck, \
-					slf or clsm, parent_class, True, prop_getter)
+			if timed:
+				start = type_util._perf_counter()
+			try:
+				checked_res = _checkfuncresult(resSig, res, toCheck, \
+						slf or clsm, parent_class, True, prop_getter, sampling)
+			except ReturnTypeError:
+				if policy:
+					_adaptive_violation(checker_tp.adaptive_state, policy)
+				raise
+			finally:
+				if timed:
+					_record_check_time(start, budget, record)
+			if policy:
+				checker_tp.adaptive_state[1] += 1
 			return checked_res
 
 	checker_tp.ch_func = func
 	checker_tp.do_typecheck = do_typecheck
 	checker_tp.do_logging = do_logging
+	checker_tp.adaptive_state = [0, 0, 0, 0, set()]
 	if hasattr(func, '__func__'):
 		checker_tp.__func__ = func.__func__
 	checker_tp.__name__ = func0.__name__ # What sorts of evil might this bring over us?
@@ -827,21 +1286,26 @@ def _typeinspect_func(func, do_typecheck, do_logging, \
 		else:
 			if not hasattr(func.fget, 'ch_func'):
 				#todo: What about @no_type_check applied to getter/setter?
-				checker_tp_get = typechecked_func(func, prop_getter = True)
+				checker_tp_get = typechecked_func(func, prop_getter = True, sampling = sampling,
+						lazy = lazy, adaptive = adaptive)
 				return property(checker_tp_get, checker_tp, func.fdel, func.__doc__)
 			return property(func.fget, checker_tp, func.fdel, func.__doc__)
 	else:
 		return checker_tp
 
-def typechecked_class(cls, force = False, force_recursive = False):
-	return _typechecked_class(cls, force, force_recursive)
+def typechecked_class(cls, force = False, force_recursive = False, codegen = None,
+			sampling = None, lazy = None, adaptive = None):
+	return _typechecked_class(cls, force, force_recursive, codegen = codegen,
+			sampling = sampling, lazy = lazy, adaptive = adaptive)
 
-def _typechecked_class(cls, force = False, force_recursive = False, nesting = None):
+def _typechecked_class(cls, force = False, force_recursive = False, nesting = None,
+			codegen = None, sampling = None, lazy = None, adaptive = None):
 	if not pytypes.checking_enabled:
 		return cls
 	assert(isclass(cls))
 	if not force and is_no_type_check(cls):
 		return cls
+	type_util._clear_typed_base_method_cache()
 	# To play it safe we avoid to modify the dict while iterating over it,
 	# so we previously cache keys.
 	# For this we don't use keys() because of Python 3.
@@ -855,7 +1319,9 @@ def _typechecked_class(cls, force = False, force_recursive = False, nesting = No
 					ismethoddescriptor(memb) or isinstance(memb, property)):
 				if _has_type_hints(getattr(cls, key), cls, nst) or \
 						hasattr(_actualfunc(memb), 'override_checked'):
-					setattr(cls, key, typechecked_func(memb, force_recursive))
+					setattr(cls, key, typechecked_func(memb, force_recursive,
+							codegen = codegen, sampling = sampling, lazy = lazy,
+							adaptive = adaptive))
 # 				else:
 # 					print ("wouldn't check", key, cls, memb, getattr(cls, key))
 			elif isclass(memb):
@@ -866,7 +1332,8 @@ def _typechecked_class(cls, force = False, force_recursive = False, nesting = No
 					nst2 = [cls]
 				nst2.append(memb)
 				#setattr(cls, key, _typechecked_class(memb, force_recursive, force_recursive, nst2))
-				_typechecked_class(memb, force_recursive, force_recursive, nst2)
+				_typechecked_class(memb, force_recursive, force_recursive, nst2, codegen,
+						sampling, lazy, adaptive)
 	return cls
 
 # Todo: Extend tests for this
@@ -883,14 +1350,12 @@ def typechecked_module(md, force_recursive = False):
 			if md is None:
 				return md
 	assert(ismodule(md))
-	if md.__name__ in _fully_typechecked_modules and \
-			_fully_typechecked_modules[md.__name__] == len(md.__dict__):
-		return md
-	# To play it safe we avoid to modify the dict while iterating over it,
-	# so we previously cache keys.
-	# For this we don't use keys() because of Python 3.
+	# Only members that are new or were replaced since the last run need processing.
+	# The keys are a snapshot, so we don't modify the dict while iterating over it.
 	# Todo: Better use inspect.getmembers here
-	keys = [key for key in md.__dict__]
+	processed = _fully_typechecked_modules.get(md.__name__, {})
+	keys = util._unprocessed_members(md, processed, force_recursive)
+	done = []
 	for key in keys:
 		memb = md.__dict__[key]
 		if force_recursive or not is_no_type_check(memb):
@@ -899,18 +1364,33 @@ def typechecked_module(md, force_recursive = False):
 				setattr(md, key, typechecked_func(memb, force_recursive))
 			elif isclass(memb) and memb.__module__ == md.__name__:
 				typechecked_class(memb, force_recursive, force_recursive)
-	_fully_typechecked_modules[md.__name__] = len(md.__dict__)
+			done.append(key)
+	util._mark_processed(md, done, processed)
+	_fully_typechecked_modules[md.__name__] = processed
 	return md
 
-def typechecked(memb):
+def typechecked(memb = None, codegen = None, sampling = None, lazy = None, adaptive = None):
+	'''Decorator applicable to functions, methods, properties, classes or modules.
+	Can be used with arguments, e.g. @typechecked(codegen = True) lets plain functions
+	and staticmethods use specialized wrappers; see pytypes.typecheck_codegen.
+	@typechecked(sampling = (k, m)) checks large containers by sampling; see
+	pytypes.container_sampling. @typechecked(lazy = True) passes List and Dict
+	arguments as proxies that check items on access; see pytypes.lazy_container_checking.
+	@typechecked(adaptive = (n, k, m, p)) checks only some calls once a function keeps
+	passing its checks; see pytypes.adaptive_checking.
+	'''
+	if memb is None:
+		return lambda memb0: typechecked(memb0, codegen, sampling, lazy, adaptive)
 	if not pytypes.checking_enabled:
 		return memb
 	if is_no_type_check(memb):
 		return memb
 	if isfunction(memb) or ismethod(memb) or ismethoddescriptor(memb) or isinstance(memb, property):
-		return typechecked_func(memb)
+		return typechecked_func(memb, codegen = codegen, sampling = sampling, lazy = lazy,
+				adaptive = adaptive)
 	if isclass(memb):
-		return typechecked_class(memb)
+		return typechecked_class(memb, codegen = codegen, sampling = sampling, lazy = lazy,
+				adaptive = adaptive)
 	if ismodule(memb):
 		return typechecked_module(memb, True)
 	return memb
@@ -919,6 +1399,7 @@ def typelogged_class(cls):
 	if not pytypes.typelogging_enabled:
 		return cls
 	assert(isclass(cls))
+	type_util._clear_typed_base_method_cache()
 	# To play it safe we avoid to modify the dict while iterating over it,
 	# so we previously cache keys.
 	# For this we don't use keys() because of Python 3.
@@ -946,14 +1427,11 @@ def typelogged_module(md):
 			if md is None:
 				return md
 	assert(ismodule(md))
-	if md.__name__ in _fully_typelogged_modules and \
-			_fully_typelogged_modules[md.__name__] == len(md.__dict__):
-		return md
-	# To play it safe we avoid to modify the dict while iterating over it,
-	# so we previously cache keys.
-	# For this we don't use keys() because of Python 3.
+	# Only members that are new or were replaced since the last run need processing.
+	# The keys are a snapshot, so we don't modify the dict while iterating over it.
 	# Todo: Better use inspect.getmembers here
-	keys = [key for key in md.__dict__]
+	processed = _fully_typelogged_modules.get(md.__name__, {})
+	keys = util._unprocessed_members(md, processed)
 	for key in keys:
 		memb = md.__dict__[key]
 		if (isfunction(memb) or ismethod(memb) or ismethoddescriptor(memb)) \
@@ -961,7 +1439,8 @@ def typelogged_module(md):
 			setattr(md, key, typelogged_func(memb))
 		elif isclass(memb) and memb.__module__ == md.__name__:
 			typelogged_class(memb)
-	_fully_typelogged_modules[md.__name__] = len(md.__dict__)
+	util._mark_processed(md, keys, processed)
+	_fully_typelogged_modules[md.__name__] = processed
 	return md
 
 def typelogged(memb):
@@ -981,6 +1460,7 @@ def auto_override_class(cls, force = False, force_recursive = False):
 	assert(isclass(cls))
 	if not force and is_no_type_check(cls):
 		return cls
+	type_util._clear_typed_base_method_cache()
 	# To play it safe we avoid to modify the dict while iterating over it,
 	# so we previously cache keys.
 	# For this we don't use keys() because of Python 3.
@@ -1009,20 +1489,20 @@ def auto_override_module(md, force_recursive = False):
 			if md is None:
 				return md
 	assert(ismodule(md))
-	if md.__name__ in _auto_override_modules and \
-			_auto_override_modules[md.__name__] == len(md.__dict__):
-		return md
-	# To play it safe we avoid to modify the dict while iterating over it,
-	# so we previously cache keys.
-	# For this we don't use keys() because of Python 3.
+	# Only members that are new or were replaced since the last run need processing.
+	# The keys are a snapshot, so we don't modify the dict while iterating over it.
 	# Todo: Better use inspect.getmembers here
-	keys = [key for key in md.__dict__]
+	processed = _auto_override_modules.get(md.__name__, {})
+	keys = util._unprocessed_members(md, processed, force_recursive)
+	done = []
 	for key in keys:
 		memb = md.__dict__[key]
 		if force_recursive or not is_no_type_check(memb):
 			if isclass(memb) and memb.__module__ == md.__name__:
 				auto_override_class(memb, force_recursive, force_recursive)
-	_auto_override_modules[md.__name__] = len(md.__dict__)
+			done.append(key)
+	util._mark_processed(md, done, processed)
+	_auto_override_modules[md.__name__] = processed
 	return md
 
 def auto_override(memb):
@@ -1035,8 +1515,9 @@ def auto_override(memb):
 	return memb
 
 def _catch_up_global_checking():
-	for mod_name in sys.modules:
-		if not mod_name in _fully_typechecked_modules:
+	for mod_name in list(sys.modules):
+		if not mod_name in _fully_typechecked_modules and \
+				util._global_mode_applies('checking', mod_name):
 			try:
 				md = sys.modules[mod_name]
 			except KeyError:
@@ -1045,18 +1526,20 @@ def _catch_up_global_checking():
 				typechecked_module(mod_name)
 
 def _catch_up_global_auto_override():
-	for mod_name in sys.modules:
-		if not mod_name in _auto_override_modules:
+	for mod_name in list(sys.modules):
+		if not mod_name in _auto_override_modules and \
+				util._global_mode_applies('auto_override', mod_name):
 			try:
 				md = sys.modules[mod_name]
 			except KeyError:
 				md = None
 			if not md is None and ismodule(md):
-				_auto_override_modules(mod_name)
+				auto_override_module(mod_name)
 
 def _catch_up_global_typelog():
-	for mod_name in sys.modules:
-		if not mod_name in _fully_typelogged_modules:
+	for mod_name in list(sys.modules):
+		if not mod_name in _fully_typelogged_modules and \
+				util._global_mode_applies('typelog', mod_name):
 			try:
 				md = sys.modules[mod_name]
 			except KeyError:
@@ -1077,6 +1560,74 @@ def is_no_type_check(memb):
 	except TypeError:
 		return False
 
+class _Unchecked(object):
+	def __init__(self):
+		self._tokens = []
+
+	def __enter__(self):
+		self._tokens.append(type_util._set_unchecked(True))
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		type_util._reset_unchecked(self._tokens.pop())
+
+	def __call__(self, func):
+		return unchecked(func)
+
+class _UncheckedGenerator(object):
+	'''Drives a generator and bypasses typechecking whenever its body runs.
+	'''
+	def __init__(self, gen):
+		self._gen = gen
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		return self.send(None)
+
+	next = __next__
+
+	def send(self, value):
+		with _Unchecked():
+			return self._gen.send(value)
+
+	def throw(self, *args):
+		with _Unchecked():
+			return self._gen.throw(*args)
+
+	def close(self):
+		with _Unchecked():
+			return self._gen.close()
+
+class _UncheckedCoroutine(_UncheckedGenerator):
+	'''Like _UncheckedGenerator, but awaitable to drive a coroutine.
+	'''
+	def __await__(self):
+		return self
+
+def unchecked(func = None):
+	'''Context manager and decorator that bypasses typechecking of calls, i.e.
+	typechecked functions and generators work like unchecked ones while it is active.
+	Unlike pytypes.checking_enabled this only applies to the current thread or asyncio
+	task (before Python 3.7 to the current thread). Use it like
+	with pytypes.unchecked(): ... or as @pytypes.unchecked.
+	Generators and coroutines returned by a decorated function are bypassed whenever
+	they resume, i.e. not in between. Async generators are not supported.
+	'''
+	if func is None:
+		return _Unchecked()
+	@functools.wraps(func)
+	def unchecked_func(*args, **kw):
+		with _Unchecked():
+			res = func(*args, **kw)
+		if inspect.isgenerator(res):
+			return _UncheckedGenerator(res)
+		if _iscoroutine(res):
+			return _UncheckedCoroutine(res)
+		return res
+	return unchecked_func
+
 def check_argument_types(cllable = None, call_args = None):
 	prop = None
 	prop_getter = False
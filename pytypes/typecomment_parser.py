@@ -4,7 +4,7 @@ Created on 13.12.2016
 @author: Stefan Richthofer
 '''
 
-import inspect
+import inspect, tokenize, linecache, os
 import pytypes
 from typing import Any
 from pytypes import TypeSyntaxError
@@ -29,7 +29,117 @@ def _parse_typecomment_oneline(line):
 					return comment
 	return None
 
+_typecomment_indices = {}
+
+def _build_typecomment_index(srclines):
+	'''Tokenizes the given source lines once and maps the first line of every
+	def (i.e. of its first decorator if any) and the line of the def-keyword
+	itself to a tuple (signature typecomment, list of per-line arg typecomments).
+	'''
+	index = {}
+	lines = iter(srclines)
+	line_start = True
+	deco_line = None
+	def_line = None
+	header = None # row -> [last code token, comment] while reading a def header
+	depth = 0
+	pending = None # [arg typecomments, header end row, comment on header end row]
+	for tok in tokenize.generate_tokens(lambda: next(lines, '')):
+		tp, tstr, row = tok[0], tok[1], tok[2][0]
+		if not pending is None:
+			if row == pending[1]:
+				if tp == tokenize.COMMENT:
+					pending[2] = tstr
+				continue
+			res = None if pending[2] is None else _parse_typecomment_oneline(pending[2])
+			if res is None and tp == tokenize.COMMENT and row == pending[1]+1:
+				res = _parse_typecomment_oneline(tstr)
+			index[def_line] = (res, pending[0])
+			if not deco_line is None:
+				index[deco_line] = index[def_line]
+			deco_line = None
+			pending = None
+		if not header is None:
+			if tp == tokenize.COMMENT:
+				header.setdefault(row, [None, None])[1] = tstr
+			elif tp != tokenize.NL and tp != tokenize.NEWLINE:
+				header.setdefault(row, [None, None])[0] = tstr
+				if tstr in ('(', '[', '{'):
+					depth += 1
+				elif tstr in (')', ']', '}'):
+					depth -= 1
+				elif tstr == ':' and depth == 0:
+					result = [None if header[hrow][1] is None else
+							_parse_typecomment_oneline(header[hrow][1])
+							for hrow in sorted(header) if hrow < row and
+							not header[hrow][0] in (None, '(')]
+					pending = [result, row, None]
+					header = None
+		elif tp in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT):
+			line_start = True
+		elif tp != tokenize.NL and tp != tokenize.COMMENT:
+			if line_start:
+				if tstr == '@':
+					if deco_line is None:
+						deco_line = row
+				elif tstr == 'def':
+					def_line = row
+					header = {row: [tstr, None]}
+					depth = 0
+				elif tstr != 'async':
+					deco_line = None
+			line_start = line_start and tstr == 'async'
+	return index
+
+def _get_typecomment_index(filename):
+	'''Returns the typecomment-index of the given source file, keyed by file
+	path and modification time. Returns None if the file cannot be tokenized.
+	'''
+	try:
+		mtime = os.path.getmtime(filename)
+	except (OSError, TypeError):
+		return None
+	try:
+		idx_mtime, index = _typecomment_indices[filename]
+		if idx_mtime == mtime:
+			return index
+		linecache.checkcache(filename)
+	except KeyError:
+		pass
+	srclines = linecache.getlines(filename)
+	if len(srclines) == 0:
+		index = None
+	else:
+		try:
+			index = _build_typecomment_index(srclines)
+		except (tokenize.TokenError, SyntaxError):
+			index = None
+	_typecomment_indices[filename] = (mtime, index)
+	return index
+
 def _get_typestrings(obj, slf):
+	code = obj
+	try:
+		# resembles what inspect.getsourcelines does
+		code = inspect.unwrap(code)
+	except AttributeError:
+		# Python 2
+		pass
+	if inspect.ismethod(code):
+		code = code.__func__
+	if not inspect.iscode(code):
+		code = getattr(code, '__code__', None)
+	if not code is None:
+		index = _get_typecomment_index(code.co_filename)
+		if not index is None:
+			try:
+				res, result = index[code.co_firstlineno]
+			except KeyError:
+				return None
+			return res, result[1:] if slf else list(result)
+	return _get_typestrings_from_source(obj, slf)
+
+def _get_typestrings_from_source(obj, slf):
 	try:
 		srclines = inspect.getsourcelines(obj)[0]
 	except IOError:
@@ -151,6 +261,50 @@ def _check_vararg_typestring(typestring, argString, argspec, func, slf, func_cla
 					typestring, func, slf, func_class))
 	return argString
 
+_typestring_cache = {}
+_unbound = object()
+
+def _typestring_cache_valid(globals, bindings):
+	for name, value in bindings:
+		if not globals.get(name, _unbound) is value:
+			return False
+	return True
+
+def _eval_typestring(typestring, globals, result = False):
+	'''Evaluates a typestring in the given namespace, caching the result per
+	typestring and namespace. A cached value is only used while all names the
+	typestring refers to are still bound to the same objects in the namespace,
+	so it is dropped e.g. once a forward-referenced name was defined meanwhile.
+	'''
+	key = (typestring, id(globals), result)
+	try:
+		globs, bindings, tp = _typestring_cache[key]
+		if globs is globals and _typestring_cache_valid(globals, bindings):
+			return tp
+	except KeyError:
+		pass
+	if result:
+		# Normalize occurrence of None to type(None).
+		# (Doing this in pre-eval manner/text-mode is easier than going
+		#  through maybe nested type-vars, etc)
+		# To avoid that this creates type(type(None)) if type(None) is already in place:
+		tpString = typestring.replace('type(None)', 'None')
+		tpString = tpString.replace('None', 'type(None)')
+	else:
+		tpString = typestring
+	code = compile(tpString, '<string>', 'eval')
+	tp = eval(code, globals)
+	if pytypes.typestring_cache_size > 0:
+		if len(_typestring_cache) >= pytypes.typestring_cache_size:
+			# also drops namespaces that are not used anymore
+			_typestring_cache.clear()
+		_typestring_cache[key] = (globals, tuple([(name, globals.get(name, _unbound))
+				for name in code.co_names]), tp)
+	return tp
+
+def _clear_typestring_cache():
+	_typestring_cache.clear()
+
 def _funcsigtypesfromstring(typestring, argTypes = None, argspec = None, globals = globals(),
 		selfType = None, argCount = None, unspecified_type = Any, defaults = None, func = None,
 		slf = False, func_class = None):
@@ -168,7 +322,7 @@ def _funcsigtypesfromstring(typestring, argTypes = None, argspec = None, globals
 # 		useEllipsis = False
 	argTypes0 = argTypes
 	resString = typestring[splt+2:].strip()
-	argTp = eval(argString, globals)
+	argTp = _eval_typestring(argString, globals)
 	if selfType is None:
 		argTypes = []
 	else:
@@ -200,12 +354,5 @@ def _funcsigtypesfromstring(typestring, argTypes = None, argspec = None, globals
 # 	if useEllipsis:
 # 		tpl.__tuple_use_ellipsis__ = True
 
-	# Normalize occurrence of None to type(None).
-	# (Doing this in pre-eval manner/text-mode is easier than going
-	#  through maybe nested type-vars, etc)
-	# To avoid that this creates type(type(None)) if type(None) is already in place:
-	resString = resString.replace('type(None)', 'None')
-	resString = resString.replace('None', 'type(None)')	
-
-	resType = eval(resString, globals)
+	resType = _eval_typestring(resString, globals, True)
 	return tpl, resType
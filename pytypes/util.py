@@ -7,7 +7,7 @@ Todo: Some functions in this module can be simplified or replaced
       by more consequent use of inspect module.
 '''
 
-import pytypes, subprocess, hashlib, sys, os, inspect
+import pytypes, subprocess, hashlib, sys, os, inspect, fnmatch
 
 _code_callable_dict = {}
 
@@ -19,6 +19,82 @@ def _check_python3_5_version():
 	except Exception:
 		return False
 
+def _module_name_matches(module_name, pattern):
+	if module_name == pattern or module_name.startswith(pattern+'.'):
+		return True
+	return fnmatch.fnmatchcase(module_name, pattern)
+
+def _global_mode_applies(mode, module_name):
+	'''Tells whether the global mode, i.e. 'checking', 'typelog', 'auto_override'
+	or 'annotations', applies to the module module_name according to
+	pytypes.global_<mode>_include and pytypes.global_<mode>_exclude.
+	'''
+	include = getattr(pytypes, 'global_'+mode+'_include')
+	exclude = getattr(pytypes, 'global_'+mode+'_exclude')
+	return (include is None or any(_module_name_matches(module_name, pattern)
+			for pattern in include)) and not any(_module_name_matches(module_name, pattern)
+			for pattern in exclude)
+
+def _processable_member(memb):
+	'''Tells whether the module-wide functions like typechecked_module
+	consider memb, i.e. whether it is a function, method or class.
+	'''
+	return inspect.isfunction(memb) or inspect.ismethod(memb) or \
+			inspect.ismethoddescriptor(memb) or inspect.isclass(memb)
+
+def _class_members(cls):
+	'''Returns the functions, properties and nested classes of cls by name,
+	nested classes along with their own members. This tells whether a class
+	was modified since it was processed.
+	'''
+	res = {}
+	for key, memb in list(cls.__dict__.items()):
+		if inspect.isclass(memb):
+			res[key] = (memb, _class_members(memb))
+		elif _processable_member(memb) or isinstance(memb, property):
+			res[key] = memb
+	return res
+
+def _unprocessed_members(md, processed, force = False):
+	'''Returns the names of members of module md that are not in processed, which
+	maps names to the functions and classes processed previously, or that were
+	replaced since. Classes also count as unprocessed if their members changed.
+	With force all names are returned. Names that were deleted from md are dropped
+	from processed.
+	'''
+	for key in [key for key in processed if not key in md.__dict__]:
+		del processed[key]
+	if force:
+		return list(md.__dict__)
+	res = []
+	for key, memb in list(md.__dict__.items()):
+		try:
+			prev = processed[key]
+		except KeyError:
+			res.append(key)
+			continue
+		if inspect.isclass(memb):
+			if not isinstance(prev, tuple) or not prev[0] is memb or \
+					prev[1] != _class_members(memb):
+				res.append(key)
+		elif not prev is memb:
+			res.append(key)
+	return res
+
+def _mark_processed(md, keys, processed):
+	'''Records the functions and classes of module md named by keys in processed,
+	i.e. the members as they were left by processing, classes along with their
+	members. Other members are not recorded, so processed does not refer to
+	arbitrary module data. Callers leave out the names of members they skipped,
+	so these are considered again next time, e.g. with force_recursive.
+	'''
+	for key in keys:
+		memb = md.__dict__.get(key)
+		if inspect.isclass(memb):
+			processed[key] = (memb, _class_members(memb))
+		elif _processable_member(memb):
+			processed[key] = memb
+
 def _md5(fname):
 	m = hashlib.md5()
 	with open(fname, 'rb') as f:
@@ -135,7 +211,7 @@ def _getargskw(args, kw, argspecs):
 	elif len(args) < len(argspecs.args):
 		res.extend(args)
 		# we'll try to get the remaining args from kw or defaults
-		ipos = -len(args)+len(res)
+		ipos = -len(argspecs.args)+len(res)
 		for name in argspecs.args[len(args):]:
 			if name in kw:
 				res.append(kw[name])
@@ -216,12 +292,107 @@ def fromargskw(argskw, argspecs, slf_or_clsm = False):
 			for name in argspecs.kwonlyargs:
 				res_kw[name] = argskw[ipos]
 				ipos += 1
+			if argspecs.varargs is None:
+				# kw-only args are passed via res_kw only
+				res_args = res_args[:-len(argspecs.kwonlyargs)]
 	except AttributeError:
 		pass
 	if res_kw is None:
 		res_kw = {}
 	return res_args, res_kw
 
+def _argspec_parts(argspecs):
+	try:
+		kwds = argspecs.keywords
+	except AttributeError:
+		kwds = argspecs.varkw
+	try:
+		kwonly = argspecs.kwonlyargs
+	except AttributeError:
+		kwonly = []
+	return argspecs.args, argspecs.varargs, kwonly, kwds
+
+def _is_plain_argspec(argspecs):
+	# Python 2 allows tuple-unpacking args, which we cannot re-generate
+	args, vargs, kwonly, kwds = _argspec_parts(argspecs)
+	for name in args:
+		if not isinstance(name, str):
+			return False
+	return True
+
+def _make_argskw_binder(argspecs):
+	'''Generates a function binder(args, kw) that is equivalent to
+	getargskw(args, kw, argspecs), but works via straight-line code rather
+	than by inspecting argspecs on each call. The function signature is
+	reproduced as in namedtuple, so Python itself performs the binding.
+	For calls that do not match the signature, it falls back to getargskw.
+	'''
+	if not _is_plain_argspec(argspecs):
+		return lambda args, kw: getargskw(args, kw, argspecs)
+	args, vargs, kwonly, kwds = _argspec_parts(argspecs)
+	params = []
+	ndefs = 0 if argspecs.defaults is None else len(argspecs.defaults)
+	for i in range(len(args)):
+		params.append(args[i] if i < len(args)-ndefs else args[i]+'=None')
+	if not vargs is None:
+		params.append('*'+vargs)
+	elif len(kwonly) > 0:
+		params.append('*')
+	kwdefs = getattr(argspecs, 'kwonlydefaults', None)
+	for name in kwonly:
+		params.append(name+'=None' if not kwdefs is None and name in kwdefs else name)
+	if not kwds is None:
+		params.append('**'+kwds)
+	names = list(args)
+	if not vargs is None:
+		names.append(vargs)
+	names.extend(kwonly)
+	if not kwds is None:
+		names.append(kwds)
+	code = 'def _bind(%s):\n\treturn (%s)\n' % (', '.join(params),
+			''.join(name+', ' for name in names))
+	namespace = {}
+	exec(code, namespace)
+	_bind = namespace['_bind']
+	_bind.__defaults__ = argspecs.defaults
+	if len(kwonly) > 0:
+		_bind.__kwdefaults__ = kwdefs
+	def binder(args, kw):
+		try:
+			return _bind(*args, **kw)
+		except TypeError:
+			return getargskw(args, kw, argspecs)
+	return binder
+
+def _make_fromargskw_binder(argspecs, slf_or_clsm = False):
+	'''Generates a function rebuild(argskw) that is equivalent to
+	fromargskw(argskw, argspecs, slf_or_clsm), i.e. turns a linearized
+	argument tuple back into (args, kw), with straight-line code.
+	'''
+	if not _is_plain_argspec(argspecs):
+		return lambda argskw: fromargskw(argskw, argspecs, slf_or_clsm)
+	args, vargs, kwonly, kwds = _argspec_parts(argspecs)
+	npos = len(args)-1 if slf_or_clsm else len(args)
+	if vargs is None:
+		res_args = 'tuple(argskw[:%d])' % npos
+	elif npos > 0:
+		res_args = 'tuple(argskw[:%d]) + tuple(argskw[%d])' % (npos, npos)
+	else:
+		res_args = 'argskw[0]'
+	if kwds is None:
+		res_kw = '{}' if len(kwonly) == 0 else 'dict()'
+	else:
+		res_kw = 'argskw[-1]' if len(kwonly) == 0 else 'dict(argskw[-1])'
+	code = ['def _rebuild(argskw):', '\tres_kw = '+res_kw]
+	ipos = -len(kwonly) - (0 if kwds is None else 1)
+	for name in kwonly:
+		code.append('\tres_kw[%r] = argskw[%d]' % (name, ipos))
+		ipos += 1
+	code.append('\treturn %s, res_kw\n' % res_args)
+	namespace = {}
+	exec('\n'.join(code), namespace)
+	return namespace['_rebuild']
+
 def _unchecked_backend(func):
 	if hasattr(func, 'ov_func'):
 		return _unchecked_backend(func.ov_func)
@@ -573,6 +744,17 @@ def _has_base_method(meth, cls):
 				return True
 	return False
 
+def _call_site():
+	"""Returns 'filename:lineno' of the innermost frame outside of pytypes' internals,
+	i.e. the site that called into a checked function.
+	"""
+	pytypes_dir = os.path.dirname(os.path.abspath(pytypes.__file__))
+	frame = sys._getframe(1)
+	while not frame.f_back is None and \
+			os.path.dirname(os.path.abspath(frame.f_code.co_filename)) == pytypes_dir:
+		frame = frame.f_back
+	return '%s:%d' % (frame.f_code.co_filename, frame.f_lineno)
+
 def _calc_traceback_limit(tb):
 	"""Calculates limit-parameter to strip away pytypes' internals when used
 	with API from traceback module.